@@ -1,12 +1,15 @@
-import json
 from typing import Dict , Any
 from langchain_openai import ChatOpenAI
 from langchain.memory import ConversationEntityMemory
 from datetime import datetime
+from entity_store import EntityStore
+from entity_extractor import ENTITY_KINDS, EntityExtractor
 
 class PersistentEntityMemory:
-    def __init__(self , storage_file: str = "entity_memory.json"):
+    def __init__(self , storage_file: str = "entity_memory.json", debounce: float = 1.0, fsync: str = 'interval'):
         self.storage_file = storage_file
+        # only changed entities get written (append log + debounce), see EntityStore
+        self.store = EntityStore(storage_file, debounce=debounce, fsync=fsync)
         self.entities = self.load_entities()
         
         #setup langchain entity memory
@@ -14,43 +17,68 @@ class PersistentEntityMemory:
         
         #load existing entities into langchain memory
         self.langchain_memory.entity_store = self.entities
+
+        # entities are extracted in the background, several conversations per llm request
+        self.extractor = EntityExtractor(self.langchain_memory.llm, self._merge_entities)
         
     def load_entities(self) -> Dict[str, any]:
         """load entities from storage"""
-        try:
-            with open(self.storage_file , 'r') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return {}
+        return self.store.load()
+    
+    def save_entities(self, *user_ids: str):
+        """Save entities to storage, just the given ones (or all of them), written shortly after in one go"""
+        self.store.mark_dirty(user_ids or None)
     
-    def save_entities(self):
-        """Save current entities to storage"""
-        print('saving entiteis')
-        with open(self.storage_file, 'w') as f:
-            json.dump(self.langchain_memory.entity_store , f , indent=2)
+    async def flush(self):
+        """wait for the queued extractions, then write everything to storage"""
+        await self.extractor.flush()
+        self.store.flush()
+
+    def close(self):
+        """finish the queued extractions and write out anything that's still pending"""
+        self.extractor.close()
+        self.store.close()
 
     def get_current_timestamp(self) -> str:
         """Return the current timestamp in ISO format"""
         return datetime.now().isoformat()
     
     def remember_user(self , user_id: str, conversation_text:str):
-        """process and remember information about a user"""
-        #extract entities from conversation
-        entities = self.langchain_memory.llm.invoke(f"Extract key information about people, companies and preferences from: {conversation_text}")
-        
-        #store user-specific information
-        if user_id not in self.entities:
-            self.entities[user_id] = {}
+        """process and remember information about a user, returns right away (entities are extracted in the background)"""
+        with self.store.lock:
+            #store user-specific information
+            if user_id not in self.entities:
+                self.entities[user_id] = {}
+            
+            # update entity information
+            self.entities[user_id].update({
+                "last_conversation": conversation_text[:200], #keep snippet
+                "last_seen": self.get_current_timestamp(),
+                "conversation_count": self.entities[user_id].get("conversation_count" , 0)+1
+            })
         
-        # update entity information
-        self.entities[user_id].update({
-            "last_conversation": conversation_text[:200], #keep snippet
-            "last_seen": self.get_current_timestamp(),
-            "conversation_count": self.entities[user_id].get("conversation_count" , 0)+1
-        })
-        
-        # save to persistent storage
-        self.save_entities()
+        # save to persistent storage (only this user)
+        self.save_entities(user_id)
+
+        #extract entities from conversation, merged by _merge_entities once the batch is back
+        self.extractor.submit(user_id, conversation_text)
+
+    def _merge_entities(self, user_id: str, extracted: Dict[str, list], limit: int = 50):
+        """add newly extracted people/companies/preferences to the user, newest last, no duplicates"""
+        with self.store.lock:
+            known = self.entities.setdefault(user_id, {}).setdefault("entities", {})
+            changed = False
+            for kind in ENTITY_KINDS:
+                values = known.setdefault(kind, [])
+                for value in extracted.get(kind, []):
+                    if value in values:
+                        values.remove(value)
+                    else:
+                        changed = True
+                    values.append(value)
+                del values[:-limit]
+        if changed:
+            self.save_entities(user_id)
     
     def get_user_context(self, user_id: str) -> str:
         """Get relevant context about a user"""
@@ -58,11 +86,15 @@ class PersistentEntityMemory:
             return "This appears to be a new user."
         
         user_info = self.entities[user_id]
+        known = user_info.get('entities', {})
         return f"""
         Previous context about this user:
         - Last seen: {user_info.get('last_seen', 'Unknown')}
         - Conversations: {user_info.get('conversation_count', 0)}
         - Last topic: {user_info.get('last_conversation', 'No previous context')}
+        - People: {', '.join(known.get('people', [])[-10:]) or 'None known'}
+        - Companies: {', '.join(known.get('companies', [])[-10:]) or 'None known'}
+        - Preferences: {', '.join(known.get('preferences', [])[-10:]) or 'None known'}
         """
 
 
@@ -77,5 +109,8 @@ print(user_context)
 # After conversation ends
 memory_system.remember_user("sarah_123", "Sarah discussed her new role as marketing director at TechCorp")
 
+# extraction runs in the background, wait for it before exiting
+memory_system.close()
+
 
 # so this is the custom base class for handling the entity graph with entity memory
\ No newline at end of file
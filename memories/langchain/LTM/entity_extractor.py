@@ -0,0 +1,153 @@
+import asyncio
+import atexit
+import json
+import logging
+import re
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ENTITY_KINDS = ('people', 'companies', 'preferences')
+
+EXTRACTION_PROMPT = """Extract key information about people, companies and preferences from each conversation below.
+Answer with only a JSON list, one object per conversation:
+[{{"id": <conversation number>, "people": [...], "companies": [...], "preferences": [...]}}]
+Use short strings, and empty lists when a conversation mentions nothing of a kind.
+
+{conversations}"""
+
+
+def parse_entities(text: str, count: int) -> List[Dict[str, List[str]]]:
+    """entities per conversation (in order) out of the model's answer, empty ones for anything missing"""
+    results = [{kind: [] for kind in ENTITY_KINDS} for _ in range(count)]
+    # models like to wrap json in a ```json fence
+    match = re.search(r'\[.*\]', text, re.DOTALL)
+    if match is None:
+        raise ValueError(f'no JSON list in extraction answer: {text[:200]!r}')
+    for position, item in enumerate(json.loads(match.group(0))):
+        if not isinstance(item, dict):
+            continue
+        number = item.get('id', position + 1)
+        if not isinstance(number, int) or not 1 <= number <= count:
+            continue
+        for kind in ENTITY_KINDS:
+            values = item.get(kind) or []
+            if isinstance(values, str):
+                values = [values]
+            results[number - 1][kind] = [str(value).strip() for value in values if str(value).strip()]
+    return results
+
+
+class EntityExtractor:
+    """Batched entity extraction that never blocks the caller.
+
+    submit() only queues the conversation (it's safe to call from any thread, with or
+    without a running event loop). An event loop on a background thread collects up to
+    `batch_size` conversations (waiting at most `max_wait` seconds for more to join),
+    sends them to the model as one request and passes every conversation's parsed
+    entities to `on_entities(key, entities)`. A batch that fails is logged and dropped.
+    """
+
+    def __init__(self, llm, on_entities: Callable[[Hashable, Dict[str, List[str]]], Any],
+                 batch_size: int = 8, max_wait: float = 0.5):
+        self.llm = llm
+        self.on_entities = on_entities
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.stats = {'submitted': 0, 'batches': 0, 'extracted': 0, 'failed': 0}
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._worker_task: Optional[asyncio.Task] = None
+        self._start_lock = threading.Lock()
+        # registered after the EntityStore, so at exit it runs first and its merges still get written
+        atexit.register(self.close)
+
+    def submit(self, key: Hashable, conversation_text: str):
+        """queue a conversation for extraction and return right away"""
+        self._start()
+        self.stats['submitted'] += 1
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (key, conversation_text))
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            started = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(self._loop)
+                self._queue = asyncio.Queue()
+                self._worker_task = self._loop.create_task(self._worker())
+                self._loop.call_soon(started.set)
+                self._loop.run_forever()
+                self._loop.close()
+
+            self._thread = threading.Thread(target=run, name='entity-extractor', daemon=True)
+            self._thread.start()
+            started.wait()
+
+    async def _worker(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.max_wait
+            while len(batch) < self.batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._process(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _process(self, batch):
+        conversations = '\n\n'.join(f'Conversation {number}:\n{text}' for number, (_, text) in enumerate(batch, 1))
+        self.stats['batches'] += 1
+        try:
+            answer = await self.llm.ainvoke(EXTRACTION_PROMPT.format(conversations=conversations))
+            results = parse_entities(getattr(answer, 'content', answer), len(batch))
+        except Exception:
+            logger.exception('entity extraction failed for %d conversations', len(batch))
+            self.stats['failed'] += len(batch)
+            return
+
+        for (key, _), entities in zip(batch, results):
+            try:
+                self.on_entities(key, entities)
+                self.stats['extracted'] += 1
+            except Exception:
+                logger.exception('failed to merge entities for %s', key)
+
+    async def flush(self):
+        """wait until everything submitted so far has been extracted and merged"""
+        if self._thread is None:
+            return
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._queue.join(), self._loop))
+
+    def close(self, timeout: Optional[float] = None):
+        """finish the queued conversations (from sync code) and stop the background loop"""
+        if self._thread is None:
+            return
+
+        async def shutdown():
+            try:
+                await self._queue.join()
+            finally:
+                self._worker_task.cancel()
+                await asyncio.gather(self._worker_task, return_exceptions=True)
+
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(timeout)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,142 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EntityStore:
+    """Persistence for PersistentEntityMemory that only writes what changed.
+
+    The entities live in a snapshot file (the json dict PersistentEntityMemory always
+    wrote) plus an append log next to it with one line per changed entity. Saving marks
+    entities dirty, a timer writes them out at most `debounce` seconds after the first
+    unsaved change, so a burst of updates to the same entity becomes one log line. When
+    the log has more lines than there are entities it gets folded into a new snapshot.
+
+    fsync: 'always' after every write, 'interval' at most every `fsync_interval` seconds,
+    'never' leaves it to the OS.
+    """
+
+    def __init__(self, path: str = "entity_memory.json", debounce: float = 1.0,
+                 fsync: str = 'interval', fsync_interval: float = 5.0, compact_min_lines: int = 1000):
+        if fsync not in ('always', 'interval', 'never'):
+            raise ValueError(f"fsync must be 'always', 'interval' or 'never', not {fsync!r}")
+        self.path = path
+        self.log_path = path + '.log'
+        self.debounce = debounce
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compact_min_lines = compact_min_lines
+
+        # hold this while changing entities so a flush never sees a half updated one
+        self.lock = threading.RLock()
+        self.entities: Dict[str, Any] = {}
+        self._dirty = set()
+        self._timer: Optional[threading.Timer] = None
+        self._log = None
+        self._log_lines = 0
+        self._last_fsync = 0.0
+        atexit.register(self.close)
+
+    def load(self) -> Dict[str, Any]:
+        """snapshot + everything logged after it"""
+        with self.lock:
+            try:
+                with open(self.path, 'r') as f:
+                    self.entities = json.load(f)
+            except FileNotFoundError:
+                self.entities = {}
+
+            self._log_lines = 0
+            try:
+                with open(self.log_path, 'rb') as f:
+                    good_offset = 0
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            break  # torn write from a crash
+                        change = json.loads(line)
+                        if change.get('deleted'):
+                            self.entities.pop(change['key'], None)
+                        else:
+                            self.entities[change['key']] = change['value']
+                        good_offset += len(line)
+                        self._log_lines += 1
+                if good_offset < os.path.getsize(self.log_path):
+                    with open(self.log_path, 'r+b') as f:
+                        f.truncate(good_offset)
+            except FileNotFoundError:
+                pass
+            return self.entities
+
+    def mark_dirty(self, keys: Optional[Iterable[str]] = None):
+        """schedule these entities (all of them when None) to be written"""
+        with self.lock:
+            self._dirty.update(self.entities if keys is None else keys)
+            if self.debounce <= 0:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.debounce, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """write all dirty entities now"""
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+
+            lines = []
+            for key in self._dirty:
+                if key in self.entities:
+                    lines.append(json.dumps({'key': key, 'value': self.entities[key]}, default=str))
+                else:
+                    lines.append(json.dumps({'key': key, 'deleted': True}))
+            if self._log is None:
+                self._log = open(self.log_path, 'a')
+            self._log.write('\n'.join(lines) + '\n')
+            self._log.flush()
+            self._maybe_fsync()
+            logger.debug('saved %d entities', len(lines))
+            self._log_lines += len(lines)
+            self._dirty.clear()
+
+            if self._log_lines >= self.compact_min_lines and self._log_lines > len(self.entities):
+                self.compact()
+
+    def _maybe_fsync(self, force: bool = False):
+        now = time.monotonic()
+        if self.fsync == 'always' or force or (self.fsync == 'interval' and now - self._last_fsync >= self.fsync_interval):
+            os.fsync(self._log.fileno())
+            self._last_fsync = now
+
+    def compact(self):
+        """fold the log into a fresh snapshot (written to a temp file and renamed, then the log is emptied)"""
+        with self.lock:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.entities, f, indent=2, default=str)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            # a crash right here leaves log lines that are also in the snapshot, replaying them is harmless
+            if self._log is not None:
+                self._log.close()
+            self._log = open(self.log_path, 'w')
+            self._log_lines = 0
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            if self._log is not None:
+                if self.fsync != 'never':
+                    self._maybe_fsync(force=True)
+                self._log.close()
+                self._log = None
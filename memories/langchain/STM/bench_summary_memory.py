@@ -0,0 +1,91 @@
+"""Per-turn latency that the summary memory adds to a conversation.
+
+Compares ConversationSummaryMemory (re-summarizes summary + new exchange inside every
+turn) with HierarchicalSummaryMemory (summarizes in the background, chunk by chunk).
+The summarizer is a stub LLM whose latency grows with its prompt, like a real one:
+`--base-ms` per call plus `--ms-per-1k-tokens`. Measured per turn is what the chain
+waits for: load_memory_variables + save_context.
+
+    python bench_summary_memory.py --turns 60
+"""
+import argparse
+import time
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain.memory import ConversationSummaryMemory
+from langchain_core.language_models.llms import LLM
+
+from hierarchical_summary import HierarchicalSummaryMemory
+
+
+class SlowFakeLLM(LLM):
+    """answers with the last words of the prompt, after a prompt size dependent delay"""
+    base_ms: float = 300.0
+    ms_per_1k_tokens: float = 200.0
+    answer_words: int = 80
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return 'slow-fake'
+
+    def get_num_tokens(self, text: str) -> int:
+        return (len(text) + 3) // 4
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> str:
+        self.calls += 1
+        time.sleep((self.base_ms + self.ms_per_1k_tokens * self.get_num_tokens(prompt) / 1000) / 1000)
+        return ' '.join(prompt.split()[-self.answer_words:])
+
+
+def exchange(turn: int):
+    return ({'input': f"Turn {turn}: I'm learning Python and want a daily routine to remember syntax, "
+                      f"today it's about list comprehensions and generators, part {turn}."},
+            {'response': f"Here is step {turn} of your routine: write five comprehensions from memory, "
+                         f"then turn each into a generator and explain the difference out loud."})
+
+
+def measure(memory, llm: SlowFakeLLM, turns: int):
+    latencies = []
+    for turn in range(turns):
+        inputs, outputs = exchange(turn)
+        started = time.perf_counter()
+        memory.load_memory_variables(inputs)
+        memory.save_context(inputs, outputs)
+        latencies.append(time.perf_counter() - started)
+    if hasattr(memory, 'flush'):
+        memory.flush()
+    context = memory.load_memory_variables({})[memory.memory_key]
+    latencies = np.array(latencies) * 1000
+    return {'mean_ms': latencies.mean(), 'p95_ms': np.percentile(latencies, 95), 'max_ms': latencies.max(),
+            'llm_calls': llm.calls, 'context_tokens': llm.get_num_tokens(context)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turns', type=int, default=60)
+    parser.add_argument('--base-ms', type=float, default=300.0)
+    parser.add_argument('--ms-per-1k-tokens', type=float, default=200.0)
+    parser.add_argument('--buffer-tokens', type=int, default=600)
+    parser.add_argument('--chunk-tokens', type=int, default=300)
+    args = parser.parse_args()
+
+    def stub():
+        return SlowFakeLLM(base_ms=args.base_ms, ms_per_1k_tokens=args.ms_per_1k_tokens)
+
+    llm = stub()
+    current = measure(ConversationSummaryMemory(llm=llm), llm, args.turns)
+    llm = stub()
+    hierarchical = measure(HierarchicalSummaryMemory(llm=llm, buffer_token_limit=args.buffer_tokens,
+                                                     chunk_token_limit=args.chunk_tokens), llm, args.turns)
+
+    print(f"{args.turns} turns, stub summarizer {args.base_ms:.0f}ms + {args.ms_per_1k_tokens:.0f}ms per 1k tokens")
+    for name, result in (('ConversationSummaryMemory', current), ('HierarchicalSummaryMemory', hierarchical)):
+        print(f"  {name:<27} added per turn: mean {result['mean_ms']:7.1f}ms  p95 {result['p95_ms']:7.1f}ms  "
+              f"max {result['max_ms']:7.1f}ms | {result['llm_calls']} summarizer calls, "
+              f"final context {result['context_tokens']} tokens")
+
+
+if __name__ == '__main__':
+    main()
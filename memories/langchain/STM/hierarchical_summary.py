@@ -0,0 +1,151 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from langchain_core.memory import BaseMemory
+from pydantic import PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+CHUNK_PROMPT = """Summarize this part of a conversation in at most {words} words.
+Keep names, facts, preferences and open questions.
+
+{text}
+
+Summary:"""
+
+MERGE_PROMPT = """These are summaries of consecutive parts of a conversation, oldest first.
+Combine them into one summary of at most {words} words. Keep names, facts, preferences and open questions.
+
+{text}
+
+Summary:"""
+
+
+class HierarchicalSummaryMemory(BaseMemory):
+    """Summary memory that keeps the turn itself free of summarization calls.
+
+    Recent turns stay verbatim in a buffer. Once they take more than `buffer_token_limit`
+    tokens the oldest ones (about `chunk_token_limit` tokens) are cut off as a chunk and
+    summarized on a background thread, in the meantime the chunk is still shown raw.
+    Every `fanout` summaries of one level get merged into a single summary one level up,
+    so each call summarizes one chunk or `fanout` short summaries: its cost never grows
+    with the length of the conversation, and the summaries shown stay logarithmic in it.
+
+    The context is the summaries (oldest, highest level first), the chunks still being
+    summarized, then the recent turns. flush() waits for the background work.
+    """
+
+    llm: Any
+    memory_key: str = "history"
+    input_key: str = "input"
+    human_prefix: str = "Human"
+    ai_prefix: str = "AI"
+    buffer_token_limit: int = 1000
+    chunk_token_limit: int = 500
+    fanout: int = 4
+    summary_words: int = 120
+
+    _turns: deque = PrivateAttr(default_factory=deque)  # (text, tokens), oldest first
+    _buffer_tokens: int = PrivateAttr(default=0)
+    _pending: deque = PrivateAttr(default_factory=deque)  # chunks queued for summarizing
+    _levels: List[List[str]] = PrivateAttr(default_factory=list)  # level 0 = chunk summaries
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    # one worker: chunks are summarized in order and merges never race each other
+    _executor: Any = PrivateAttr(default_factory=lambda: ThreadPoolExecutor(max_workers=1, thread_name_prefix='summarize'))
+    _stats: Dict[str, float] = PrivateAttr(default_factory=lambda: {'chunks': 0, 'merges': 0, 'failed': 0, 'seconds': 0.0})
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        return dict(self._stats)
+
+    def count_tokens(self, text: str) -> int:
+        try:
+            return self.llm.get_num_tokens(text)
+        except Exception:  # no tokenizer available offline
+            return (len(text) + 3) // 4
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, str]:
+        with self._lock:
+            summaries = [summary for level in reversed(self._levels) for summary in level]
+            parts = []
+            if summaries:
+                parts.append("Summary of the earlier conversation:\n" + "\n".join(summaries))
+            parts.extend(self._pending)
+            parts.extend(text for text, _ in self._turns)
+        return {self.memory_key: "\n".join(parts)}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        """add the turn to the buffer, summarizing (if due) happens in the background"""
+        human = inputs.get(self.input_key) or next(iter(inputs.values()), "")
+        ai = next(iter(outputs.values()), "")
+        text = f"{self.human_prefix}: {human}\n{self.ai_prefix}: {ai}"
+        tokens = self.count_tokens(text)
+
+        with self._lock:
+            self._turns.append((text, tokens))
+            self._buffer_tokens += tokens
+            while self._buffer_tokens > self.buffer_token_limit and len(self._turns) > 1:
+                chunk, chunk_tokens = [], 0
+                while len(self._turns) > 1 and chunk_tokens < self.chunk_token_limit:
+                    turn, turn_tokens = self._turns.popleft()
+                    chunk.append(turn)
+                    chunk_tokens += turn_tokens
+                self._buffer_tokens -= chunk_tokens
+                chunk = "\n".join(chunk)
+                self._pending.append(chunk)
+                self._executor.submit(self._summarize_chunk, chunk)
+
+    def _summarize(self, prompt: str, text: str, fallback: str) -> str:
+        started = time.perf_counter()
+        try:
+            answer = self.llm.invoke(prompt.format(words=self.summary_words, text=text))
+            return str(getattr(answer, 'content', answer)).strip()
+        except Exception:
+            # better a long context than a lost one
+            logger.exception('summarizing %d characters failed', len(text))
+            self._stats['failed'] += 1
+            return fallback
+        finally:
+            self._stats['seconds'] += time.perf_counter() - started
+
+    def _summarize_chunk(self, chunk: str):
+        summary = self._summarize(CHUNK_PROMPT, chunk, fallback=chunk)
+        self._stats['chunks'] += 1
+        with self._lock:
+            self._pending.popleft()  # the only worker goes in submit order
+            if not self._levels:
+                self._levels.append([])
+            self._levels[0].append(summary)
+
+        level = 0
+        while level < len(self._levels) and len(self._levels[level]) >= self.fanout:
+            # the summaries stay visible until their merged version replaces them
+            group = self._levels[level][:self.fanout]
+            merged = self._summarize(MERGE_PROMPT, "\n\n".join(group), fallback="\n".join(group))
+            self._stats['merges'] += 1
+            with self._lock:
+                del self._levels[level][:self.fanout]
+                if level + 1 == len(self._levels):
+                    self._levels.append([])
+                self._levels[level + 1].append(merged)
+            level += 1
+
+    def flush(self):
+        """wait until everything queued so far is summarized"""
+        self._executor.submit(lambda: None).result()
+
+    def clear(self) -> None:
+        self.flush()
+        with self._lock:
+            self._turns.clear()
+            self._pending.clear()
+            self._levels.clear()
+            self._buffer_tokens = 0
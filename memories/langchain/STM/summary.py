@@ -1,10 +1,13 @@
-from langchain.memory import ConversationSummaryMemory
 from langchain_openai import ChatOpenAI
 from langchain.chains.conversation.base import ConversationChain
+from hierarchical_summary import HierarchicalSummaryMemory
 #create memory that summerizes old conversations
-summary_memory = ConversationSummaryMemory(
+# (ConversationSummaryMemory re-summarized everything on every turn, this one keeps recent
+# turns raw and summarizes old chunks in the background, summaries of summaries as it grows)
+summary_memory = HierarchicalSummaryMemory(
     llm=ChatOpenAI(temperature=0),
-    max_token_limit = 1000
+    buffer_token_limit = 1000,
+    chunk_token_limit = 500
 )
 
 conversation_with_memory = ConversationChain(
@@ -25,3 +28,6 @@ print(response3)
 
 response4 = conversation_with_memory.predict(input="That would be great. Something I can follow every day.")
 print(response4)
+
+# wait for summaries still being written before exiting
+summary_memory.flush()
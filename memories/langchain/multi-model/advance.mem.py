@@ -9,7 +9,13 @@ from langchain_core.runnables import RunnableMap
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
-from langchain_core.chat_history import InMemoryChatMessageHistory
+from session_store import SessionHistoryStore
+from user_patterns import UserPatternStore
+from collections import OrderedDict
+from concurrent.futures import Future
+import asyncio
+import threading
+import time
 
 # --------- Advanced Memory Setup -------------
 class AdvancedMemorySystem:
@@ -47,39 +53,111 @@ class AdvancedMemorySystem:
             ]
         )
 
-        self.user_patterns = {}
-
-    def track_interaction_pattern(self, user_id: str, interacation_data: dict):
-        if user_id not in self.user_patterns:
-            self.user_patterns[user_id] = {
-                'preferred_response_length': 'medium',
-                'typical_session_duration': 0,
-                'common_topics': [],
-                'interaction_times': [],
-                'complexity_preference': 'intermediate'
-            }
-
-        patterns = self.user_patterns[user_id]
-
-        if 'response_length_preference' in interacation_data:
-            patterns['preferred_response_length'] = interacation_data['response_length_preference']
-
-        if 'session_duration' in interacation_data:
-            current_avg = patterns['typical_session_duration']
-            new_duration = interacation_data['session_duration']
-            patterns['typical_session_duration'] = (current_avg * 0.8) + (new_duration * 0.2)
-
-        if 'topics' in interacation_data:
-            for topic in interacation_data['topics']:
-                if topic not in patterns['common_topics']:
-                    patterns['common_topics'].append(topic)
+        # sources for the async loader, with how long each one may take before the turn goes on without it
+        # (entity and KG extraction make their own LLM calls, so they get the most time)
+        self.memory_sources = {
+            'summary': self.summary_memory,
+            'entity': self.entity_memory,
+            'kg': self.kg_memory,
+            'buffer': self.buffer_memory,
+        }
+        self.source_timeouts = {'summary': 2.0, 'entity': 4.0, 'kg': 4.0, 'buffer': 0.5}
+        self.source_stats = {name: {'calls': 0, 'timeouts': 0, 'errors': 0, 'skipped': 0,
+                                    'last_latency': None, 'total_latency': 0.0}
+                             for name in self.memory_sources}
+        # the memories are sync, each load runs in a daemon thread of its own (not an executor: asyncio.run
+        # and interpreter shutdown join executor threads, so a hung source would block exit). A source
+        # that hangs only ever ties up its own thread, and never has more than one load running (see _inflight).
+        self._inflight = {name: None for name in self.memory_sources}
+
+        # fixed size packed record per user (top topics, decayed duration stats, recent interaction times)
+        self.user_patterns = UserPatternStore()
+        # rendered contexts, reused until the user's pattern version changes (LRU bounded)
+        self.context_cache = OrderedDict()
+        self.context_cache_size = 100_000
+
+    async def aload_memory_variables(self, inputs: dict, timeouts: dict = None) -> dict:
+        """Async version of combined_memory.load_memory_variables that loads every source at once.
+
+        A source that misses its timeout (self.source_timeouts, overridable per call) or fails
+        is left out: its variables come back empty so the prompt still renders with partial
+        context. So is a source whose previous load (one that timed out) is still running,
+        instead of queueing behind it. Latency, timeouts, errors and skips per source are
+        recorded in self.source_stats.
+        """
+        timeouts = {**self.source_timeouts, **(timeouts or {})}
+
+        async def load(name, memory):
+            started = time.perf_counter()
+            stats = self.source_stats[name]
+            stats['calls'] += 1
+            previous = self._inflight[name]
+            if previous is not None and not previous.done():
+                stats['skipped'] += 1
+                return {key: "" for key in memory.memory_variables}
+            try:
+                # the source's thread is free, so the load starts right away and the timeout only covers the load itself
+                future = self._inflight[name] = self._start_load(name, memory, inputs)
+                waiting = asyncio.wrap_future(future)
+                # on timeout the thread finishes in the background and its result (or error) is dropped
+                waiting.add_done_callback(lambda done: done.cancelled() or done.exception())
+                return await asyncio.wait_for(asyncio.shield(waiting), timeouts.get(name))
+            except asyncio.TimeoutError:
+                stats['timeouts'] += 1
+            except Exception:
+                stats['errors'] += 1
+            finally:
+                stats['last_latency'] = time.perf_counter() - started
+                stats['total_latency'] += stats['last_latency']
+            return {key: "" for key in memory.memory_variables}
+
+        results = await asyncio.gather(*(load(name, memory) for name, memory in self.memory_sources.items()))
+        memory_data = {}
+        for data in results:
+            memory_data.update(data)
+        return memory_data
+
+    @staticmethod
+    def _start_load(name: str, memory, inputs: dict) -> Future:
+        future = Future()
+
+        def run():
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(memory.load_memory_variables(inputs))
+                except BaseException as error:
+                    future.set_exception(error)
+
+        threading.Thread(target=run, name=f'memory-load-{name}', daemon=True).start()
+        return future
+
+    def track_interaction_pattern(self, user_id: str, interacation_data: dict) -> bool:
+        """record an interaction (O(1) per topic), returns whether the user's patterns changed"""
+        return self.user_patterns.update(user_id, interacation_data)
 
     def get_personalized_context(self, user_id: str) -> str:
-        if user_id not in self.user_patterns:
+        version = self.user_patterns.version(user_id)
+        cached = self.context_cache.get(user_id)
+        if cached is not None and cached[0] == version:
+            self.context_cache.move_to_end(user_id)
+            return cached[1]
+
+        context = self._render_personalized_context(user_id)
+        self.context_cache[user_id] = (version, context)
+        self.context_cache.move_to_end(user_id)
+        if len(self.context_cache) > self.context_cache_size:
+            self.context_cache.popitem(last=False)
+        return context
+
+    def get_personalized_contexts(self, user_ids) -> dict:
+        """contexts of many users at once, e.g. to warm the cache before a traffic peak"""
+        return {user_id: self.get_personalized_context(user_id) for user_id in user_ids}
+
+    def _render_personalized_context(self, user_id: str) -> str:
+        patterns = self.user_patterns.patterns(user_id)
+        if patterns is None:
             return ""
 
-        patterns = self.user_patterns[user_id]
-
         context = f"""
         User Interaction Preferences:
         - Prefers {patterns['preferred_response_length']} length responses
@@ -102,12 +180,17 @@ Conversation History: {chat_history}
 """)
 
 # --------- Session Memory Store -------------
-memory_store = {}
+# bounded: idle sessions expire, least recently used ones go first when over budget,
+# and evicted sessions are spilled to disk and come back on their next message
+memory_store = SessionHistoryStore(
+    max_sessions=10_000,
+    ttl_seconds=60 * 60,
+    max_bytes=256 * 1024 * 1024,
+    spill_dir="session_histories"
+)
 
 def get_message_history(session_id: str):
-    if session_id not in memory_store:
-        memory_store[session_id] = InMemoryChatMessageHistory()
-    return memory_store[session_id]
+    return memory_store.get(session_id)
 
 if __name__ == "__main__":
     user_id = "Nikhil_123"
@@ -131,7 +214,8 @@ if __name__ == "__main__":
         history_messages_key="chat_history"
     )
 
-    memory_vars = advanced_memory.combined_memory.load_memory_variables({"input": ""})
+    # all memory sources at once, a slow one (like KG extraction) is skipped instead of holding up the turn
+    memory_vars = asyncio.run(advanced_memory.aload_memory_variables({"input": ""}))
 
     full_inputs = {
         "chat_history": memory_vars.get("chat_history", ""),
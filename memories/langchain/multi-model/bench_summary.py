@@ -0,0 +1,64 @@
+"""Benchmark for create_memory_summary over synthetic memories.
+
+Words are drawn from a Zipf distribution over a large vocabulary (like real text), we
+time the old approach (dict of counts + sorting every term), the exact streaming
+summarizer and the count-min sketch mode, and check how many of the exact top terms the
+sketch finds.
+
+    python bench_summary.py --memories 100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from compressor_loader import mem_compressor
+
+
+def make_memories(n: int, vocabulary: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    words = np.array([f'term{i:06d}' for i in range(vocabulary)])
+    ranks = np.minimum(rng.zipf(1.2, size=n * 20), vocabulary) - 1
+    return [{'content': ' '.join(words[ranks[i * 20:(i + 1) * 20]])} for i in range(n)]
+
+
+def sort_all_terms(memories):
+    """what the old summary did (when it didn't return early): count everything, sort every term"""
+    topics = {}
+    for memory in memories:
+        for word in memory.get('content', '').lower().split():
+            if len(word) > 4:
+                topics[word] = topics.get(word, 0) + 1
+    return [topic for topic, count in sorted(topics.items(), key=lambda x: x[1], reverse=True)][:20]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--memories', type=int, default=100_000)
+    parser.add_argument('--vocabulary', type=int, default=500_000)
+    args = parser.parse_args()
+
+    memories = make_memories(args.memories, args.vocabulary)
+    compressor = mem_compressor.IntelligentMemoryCompressor()
+
+    start = time.perf_counter()
+    baseline = sort_all_terms(memories)
+    print(f'dict + full sort   {time.perf_counter() - start:.2f}s')
+
+    start = time.perf_counter()
+    exact = compressor.create_memory_summary(memories)
+    print(f'streaming exact    {time.perf_counter() - start:.2f}s')
+
+    start = time.perf_counter()
+    sketch = compressor.create_memory_summary(iter(memories), sketch=True)
+    print(f'streaming sketch   {time.perf_counter() - start:.2f}s')
+
+    exact_terms = exact.split(': ', 1)[1].split(', ')
+    sketch_terms = sketch.split(': ', 1)[1].split(', ')
+    print(f'exact top terms match the full sort: {set(exact_terms) == set(baseline)}')
+    print(f'sketch found {len(set(exact_terms) & set(sketch_terms))}/{len(exact_terms)} of the exact top terms')
+    print(f'summary length {len(exact)} chars: {exact[:100]}...')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Nightly bulk compression of many users' memories, sharded across processes.
+
+Input and output are JSONL files with one user per line:
+
+    {"user_id": "sarah_123", "memories": [{"content": ..., "timestamp": ..., "mention_count": ...}, ...]}
+
+The parent only reads lines and writes lines, parsing and compressing happens in the
+worker processes, and at most `max_in_flight` batches of users are ever pending, so the
+parent never holds the whole export. Output keeps the input order. Every user gets the
+same `now`, which makes each result identical to compress_memories(memories, now=now)
+run serially.
+
+    python bulk_compress.py memories.jsonl compressed.jsonl --workers 8
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from compressor_loader import mem_compressor
+
+_compressor = None  # one per worker process
+
+
+def compress_lines(lines: List[str], now: str) -> Tuple[List[str], int]:
+    """compress a batch of user lines, returns the output lines and how many memories went in"""
+    global _compressor
+    if _compressor is None:
+        _compressor = mem_compressor.IntelligentMemoryCompressor()
+    now = datetime.fromisoformat(now)
+
+    output, memory_count = [], 0
+    for line in lines:
+        user = json.loads(line)
+        memory_count += len(user['memories'])
+        compressed = _compressor.compress_memories(user['memories'], now=now)
+        output.append(json.dumps({'user_id': user['user_id'], 'memories': compressed}) + '\n')
+    return output, memory_count
+
+
+def compress_file(input_path: str, output_path: str, workers: Optional[int] = None,
+                  users_per_batch: int = 64, max_in_flight: Optional[int] = None,
+                  now: Optional[datetime] = None) -> Dict[str, float]:
+    """Compress every user in input_path into output_path, workers=0 runs serially in this process"""
+    now = (now or datetime.now()).isoformat()
+    workers = os.cpu_count() if workers is None else workers
+    max_in_flight = max_in_flight or 4 * max(workers, 1)
+    users = memories = 0
+    started = time.perf_counter()
+
+    with open(input_path) as source, open(output_path, 'w') as target:
+        lines = (line for line in source if line.strip())
+        batches = iter(lambda: list(itertools.islice(lines, users_per_batch)), [])
+
+        if workers == 0:
+            for batch in batches:
+                output, count = compress_lines(batch, now)
+                target.writelines(output)
+                users, memories = users + len(output), memories + count
+        else:
+            with ProcessPoolExecutor(workers) as pool:
+                pending = deque()
+                for batch in itertools.chain(batches, [None]):
+                    if batch is not None:
+                        pending.append(pool.submit(compress_lines, batch, now))
+                    # write finished batches in order, and wait for the oldest once too many are pending
+                    while pending and (batch is None or len(pending) >= max_in_flight or pending[0].done()):
+                        output, count = pending.popleft().result()
+                        target.writelines(output)
+                        users, memories = users + len(output), memories + count
+
+    elapsed = time.perf_counter() - started
+    return {'users': users, 'memories': memories, 'seconds': elapsed,
+            'memories_per_second': memories / elapsed if elapsed else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input')
+    parser.add_argument('output')
+    parser.add_argument('--workers', type=int, default=None, help='processes, 0 = serial (default: all cores)')
+    parser.add_argument('--users-per-batch', type=int, default=64)
+    args = parser.parse_args()
+
+    stats = compress_file(args.input, args.output, workers=args.workers, users_per_batch=args.users_per_batch)
+    print(f"compressed {stats['users']} users / {stats['memories']} memories in {stats['seconds']:.2f}s "
+          f"({stats['memories_per_second']:.0f} memories/sec)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+"""mem.compressor.py can't be imported by name because of the dot, import it from here:
+
+    from compressor_loader import mem_compressor
+
+It's registered in sys.modules as 'mem_compressor' (loaded once per process), so its
+classes and functions pickle by name for worker processes.
+"""
+import importlib.util
+import os
+import sys
+
+
+def load_compressor_module():
+    if 'mem_compressor' not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            'mem_compressor', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mem.compressor.py'))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules['mem_compressor'] = module
+        spec.loader.exec_module(module)
+    return sys.modules['mem_compressor']
+
+
+mem_compressor = load_compressor_module()
@@ -1,8 +1,15 @@
 import json
+import heapq
+import itertools
+from collections import Counter
 from datetime import datetime , timedelta
-from typing import Dict , List , Any
+from typing import Dict , List , Any, Iterable, Iterator
+import warnings
+import zlib
 import numpy as np
 
+IMPORTANT_KEYWORDS = ['problem', 'project', 'deadline', 'important', 'urgent', 'remember']
+
 class IntelligentMemoryCompressor:
     def __init__(self):
         self.compression_rules = {
@@ -27,7 +34,7 @@ class IntelligentMemoryCompressor:
         engagement_score = min(1.0 , len(memory.get('content','')) / 500 )
         
         # Keywords that indicate importance
-        important_keywords = ['problem', 'project', 'deadline', 'important', 'urgent', 'remember']
+        important_keywords = IMPORTANT_KEYWORDS
         
         keyword_score = sum(1 for keyword in important_keywords 
                             if keyword in memory.get('content', '').lower()) / len(important_keywords)
@@ -43,74 +50,341 @@ class IntelligentMemoryCompressor:
         
         return min(1.0, total_score)
     
-    def compress_memories(self, memories: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Intellignetly compress memory list"""
+    def score_memories(self, memories: List[Dict[str, Any]], now: datetime = None,
+                       chunk_size: int = 100_000) -> np.ndarray:
+        """calculate_memory_importance for a whole collection at once, as a numpy array.
+
+        Same scores as the one-by-one version, but every part is computed for a chunk of
+        memories with array ops (datetime.now() is read once, timestamps are parsed by numpy).
+        Chunks keep the temporary lists small when there are millions of memories.
+        """
+        now = np.datetime64(now or datetime.now(), 'us')
+        scores = np.empty(len(memories), dtype=np.float64)
+        for start in range(0, len(memories), chunk_size):
+            chunk = memories[start:start + chunk_size]
+            scores[start:start + len(chunk)] = self._score_chunk(chunk, now)
+        return scores
+    
+    def _score_chunk(self, memories: List[Dict[str, Any]], now: np.datetime64) -> np.ndarray:
+        timestamps, frequency, engagement, keyword = self._score_parts(memories)
         
-        # Score All Memories
-        scored_memories = []
+        # Recency score, whole days like timedelta.days (floored)
+        days_old = (now - timestamps) // np.timedelta64(1, 'D')
+        recency_score = np.maximum(0, 1 - (days_old / 30))
         
-        for memory in memories:
-            importance = self.calculate_memory_importance(memory)
-            scored_memories.append((importance , memory))
+        # Weighted combination (same order of additions as calculate_memory_importance)
+        return np.minimum(1.0, recency_score * self.compression_rules['recency_weight'] + frequency + engagement + keyword)
+    
+    def _score_parts(self, memories: List[Dict[str, Any]]):
+        """parsed timestamps + the weighted frequency, engagement and keyword scores (the parts that don't depend on the time)"""
+        count = len(memories)
+        rules = self.compression_rules
+        timestamps = self._parse_timestamps([memory['timestamp'] for memory in memories])
+        
+        # Frequency score
+        mentions = np.fromiter((memory.get('mention_count', 1) for memory in memories), dtype=np.float64, count=count)
+        frequency_score = np.minimum(1.0, mentions / 10)
+        
+        # Engagement score
+        contents = [memory.get('content', '') for memory in memories]
+        engagement_score = np.minimum(1.0, np.fromiter(map(len, contents), dtype=np.float64, count=count) / 500)
+        
+        # Keyword score, one substring pass per keyword over the lowercased contents
+        # (numpy's string ops are slower than str.__contains__ for this)
+        lowered = [content.lower() for content in contents]
+        keyword_hits = np.zeros(count, dtype=np.int64)
+        for keyword in IMPORTANT_KEYWORDS:
+            keyword_hits += np.fromiter((keyword in content for content in lowered), dtype=bool, count=count)
+        keyword_score = keyword_hits / len(IMPORTANT_KEYWORDS)
+        
+        return (timestamps,
+                frequency_score * rules['frequency_weight'],
+                engagement_score * rules['user_engagement_weight'],
+                keyword_score * 0.2)
+    
+    @staticmethod
+    def _parse_timestamps(timestamps: List[str]) -> np.ndarray:
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('error')  # numpy only warns about timezone offsets
+                return np.array(timestamps, dtype='datetime64[us]')
+        except (ValueError, Warning):
+            # formats numpy can't parse, go through datetime like calculate_memory_importance does
+            return np.array([datetime.fromisoformat(timestamp) for timestamp in timestamps], dtype='datetime64[us]')
+    
+    def rank_memories(self, scores: np.ndarray, keep_count: int):
+        """positions of the top keep_count scores and of the rest, both best first (ties keep input order).
+
+        argpartition finds the cut in O(n), only the two parts get ordered.
+        """
+        positions = np.arange(len(scores))
+        if keep_count <= 0 or keep_count >= len(scores):
+            keep = np.zeros(len(scores), dtype=bool) if keep_count <= 0 else np.ones(len(scores), dtype=bool)
+        else:
+            cutoff = scores[np.argpartition(-scores, keep_count - 1)[keep_count - 1]]
+            keep = scores > cutoff
+            # memories tied with the cutoff score: the earliest ones make it, like with a stable sort
+            ties = np.flatnonzero(scores == cutoff)[:keep_count - int(keep.sum())]
+            keep[ties] = True
+        kept, rest = positions[keep], positions[~keep]
+        return kept[np.lexsort((kept, -scores[kept]))], rest[np.lexsort((rest, -scores[rest]))]
+    
+    def compress_memories(self, memories: List[Dict[str, Any]], now: datetime = None) -> List[Dict[str, Any]]:
+        """Intellignetly compress memory list
         
-        # Sort By Importance
-        scored_memories.sort(key=lambda x: x[0] , reverse=True)
+        `now` defaults to the current time, pass it to get reproducible results (bulk runs do)
+        """
+        now = now or datetime.now()
+        
+        # Score All Memories (in one vectorized pass)
+        scores = self.score_memories(memories, now=now)
         
         # keep up top 70% of important memories
-        keep_count = int(len(scored_memories)*0.7)
-        important_memories = [memory for _, memory in scored_memories[:keep_count]]
+        keep_count = int(len(memories)*0.7)
+        kept, rest = self.rank_memories(scores, keep_count)
+        important_memories = [memories[position] for position in kept]
         
         # Summarize the rest
-        less_important = [memory for _, memory in scored_memories[keep_count:]]
+        less_important = [memories[position] for position in rest]
         if less_important:
             summary = self.create_memory_summary(less_important)
             important_memories.append({
                  'type': 'summary',
                 'content': summary,
-                'timestamp': datetime.now().isoformat(),
+                'timestamp': now.isoformat(),
                 'original_count': len(less_important)
             })
         
         return important_memories
     
-    def create_memory_summary(self , memories:List[Dict[str , Any]]) -> str:
-        """Create a summary of multiple memories"""
-        # Simple summarization - in production you'd use an llm
-        topics = {}
+    def create_memory_summary(self , memories:Iterable[Dict[str , Any]], max_terms: int = 20,
+                              sketch: bool = False, max_length: int = 500) -> str:
+        """Create a summary of multiple memories
         
+        One pass over the memories (any iterable), only the `max_terms` most common terms
+        make it into the summary and the text is capped at `max_length` characters.
+        sketch=True counts with a fixed size count-min sketch, for inputs with a huge vocabulary.
+        """
+        # Simple summarization - in production you'd use an llm
+        topics = TermCounter(sketch=sketch)
+        count = 0
         for memory in memories:
-            content = memory.get('content' , '')
-            # extract topics (simplified)
-            words = content.lower().split()
-            for word in words:
-                if len(word) > 4:
-                    topics[word] = topics.get(word , 0) + 1
-                    
-            # Get most common topics
-            common_topics = sorted(topics.items() , key=lambda x: x[1] , reverse=True)
-            topic_list = [topic for topic, count in common_topics]
-            
-            return f"Summary of {len(memories)} conversations covering: {', '.join(topic_list)}"
+            count += 1
+            topics.add(memory.get('content' , ''))
         
+        # Get most common topics
+        topic_list = [topic for topic, _ in topics.most_common(max_terms)]
+        return format_summary(count, topic_list, max_length)
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """memories from a JSONL export one at a time, the file is never loaded as a whole"""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def format_summary(count: int, topics: List[str], max_length: int = 500) -> str:
+    """summary line listing as many topics as fit in max_length characters"""
+    summary = f"Summary of {count} conversations covering: "
+    listed = []
+    for topic in topics:
+        if len(summary) + len(', '.join(listed + [topic])) > max_length:
+            break
+        listed.append(topic)
+    return summary + ', '.join(listed)
+
+
+class TermCounter:
+    """Counts summary terms (lowercased words longer than 4 characters) in a single streaming pass.
+    
+    Exact mode is a Counter. Sketch mode is for inputs with a huge vocabulary: counts go
+    into a count-min sketch (depth x width counters, fixed memory no matter how many
+    distinct terms) and only the `candidates` terms with the highest estimates are kept by
+    name. Words are hashed in batches so the sketch is updated with numpy, not per word.
+    """
+    
+    def __init__(self, sketch: bool = False, width: int = 1 << 16, depth: int = 4,
+                 candidates: int = 1000, batch_words: int = 50_000):
+        self.sketch = sketch
+        self.counts = Counter()
+        if sketch:
+            if width & (width - 1):
+                raise ValueError('width must be a power of two')
+            self.width = width
+            self.table = np.zeros((depth, width), dtype=np.int64)
+            # multiply-shift hashing, one odd multiplier per row
+            self._multipliers = np.random.default_rng(0).integers(1, 2**63, size=depth, dtype=np.uint64) | np.uint64(1)
+            self._shift = np.uint64(64 - (width.bit_length() - 1))
+            self.candidates = candidates
+            self.batch_words = batch_words
+            self._pending: List[str] = []
+    
+    def add(self, text: str):
+        if not self.sketch:
+            # counting every word (C speed) and skipping the short ones at the end is faster than filtering here
+            self.counts.update(text.lower().split())
+            return
+        self._pending.extend(word for word in text.lower().split() if len(word) > 4)
+        if len(self._pending) >= self.batch_words:
+            self._flush()
+    
+    def _buckets(self, words: List[str]) -> np.ndarray:
+        # crc32, not hash(): str hashes are salted per process, the counts must not depend on PYTHONHASHSEED
+        hashes = np.fromiter((zlib.crc32(word.encode()) for word in words), dtype=np.uint64, count=len(words))
+        return (hashes[None, :] * self._multipliers[:, None]) >> self._shift  # depth x len(words), wraps mod 2**64
+    
+    def _estimate(self, words: List[str]) -> np.ndarray:
+        buckets = self._buckets(words)
+        return np.min([row[bucket] for row, bucket in zip(self.table, buckets)], axis=0)
+    
+    def _flush(self):
+        words, self._pending = self._pending, []
+        if not words:
+            return
+        for row, bucket in zip(self.table, self._buckets(words)):
+            row += np.bincount(bucket.astype(np.int64), minlength=self.width)
+        
+        # terms of this batch compete with the current candidates on their estimates
+        unique = list(dict.fromkeys(words))
+        for word, estimate in zip(unique, self._estimate(unique).tolist()):
+            self.counts[word] = estimate
+        if len(self.counts) > 2 * self.candidates:
+            self.counts = Counter(dict(self.counts.most_common(self.candidates)))
+    
+    def most_common(self, n: int):
+        if not self.sketch:
+            return heapq.nlargest(n, ((term, count) for term, count in self.counts.items() if len(term) > 4),
+                                  key=lambda item: item[1])
+        self._flush()
+        if not self.counts:
+            return []
+        # estimates of older candidates may have grown since they were stored
+        names = list(self.counts)
+        return Counter(dict(zip(names, self._estimate(names).tolist()))).most_common(n)
+
+
+class SummaryBucket:
+    """Rolling summary of the memories a StreamingMemoryCompressor let go"""
+    
+    def __init__(self, sketch: bool = False):
+        self.count = 0
+        self.terms = TermCounter(sketch=sketch)
+    
+    def add(self, memory: Dict[str, Any]):
+        self.count += 1
+        self.terms.add(memory.get('content', ''))
+    
+    def summary(self, max_terms: int = 20, max_length: int = 500) -> str:
+        topic_list = [topic for topic, _ in self.terms.most_common(max_terms)]
+        return format_summary(self.count, topic_list, max_length)
+    
+    def as_memory(self) -> Dict[str, Any]:
+        return {
+            'type': 'summary',
+            'content': self.summary(),
+            'timestamp': datetime.now().isoformat(),
+            'original_count': self.count
+        }
+
+
+class StreamingMemoryCompressor:
+    """Online version of compress_memories: keeps the `capacity` most important memories seen so far.
+    
+    Memories are pushed one by one (or from any iterator) into a min-heap, when it's full
+    the least important memory goes into a rolling SummaryBucket. Importance decays with
+    age (halves every `half_life_days`) instead of the 30 day window, and the heap key is
+    log2(importance when created) + created / half_life. Every memory decays at the same
+    rate, so ordering by that key is the same as ordering by the current decayed score:
+    nothing ever has to be re-scored and the retained set is always ready.
+    """
+    
+    def __init__(self, capacity: int = 10_000, half_life_days: float = 15.0,
+                 compressor: IntelligentMemoryCompressor = None, chunk_size: int = 10_000):
+        self.capacity = capacity
+        self.half_life_days = half_life_days
+        self.compressor = compressor or IntelligentMemoryCompressor()
+        self.chunk_size = chunk_size
+        self.bucket = SummaryBucket()
+        self._heap = []  # (key, sequence, memory), least important on top
+        self._sequence = itertools.count()
+    
+    def __len__(self) -> int:
+        return len(self._heap)
+    
+    def push(self, memory: Dict[str, Any]):
+        self.extend([memory])
+    
+    def extend(self, memories: Iterable[Dict[str, Any]]):
+        """push everything from an iterable (a generator is consumed chunk by chunk, never as a whole list)"""
+        memories = iter(memories)
+        while True:
+            chunk = list(itertools.islice(memories, self.chunk_size))
+            if not chunk:
+                return
+            for key, memory in zip(self._keys(chunk).tolist(), chunk):
+                entry = (key, next(self._sequence), memory)
+                if len(self._heap) < self.capacity:
+                    heapq.heappush(self._heap, entry)
+                elif key > self._heap[0][0]:
+                    self.bucket.add(heapq.heapreplace(self._heap, entry)[2])
+                else:
+                    self.bucket.add(memory)
+    
+    def _keys(self, memories: List[Dict[str, Any]]) -> np.ndarray:
+        timestamps, frequency, engagement, keyword = self.compressor._score_parts(memories)
+        # importance when the memory was created = full recency score
+        created_score = np.minimum(1.0, self.compressor.compression_rules['recency_weight'] + frequency + engagement + keyword)
+        created_days = timestamps.astype(np.int64) / 86_400e6  # datetime64[us] -> days
+        return np.log2(np.maximum(created_score, 1e-12)) + created_days / self.half_life_days
+    
+    def score(self, key: float, now: datetime = None) -> float:
+        """decayed importance of a heap key at `now`"""
+        now_days = np.datetime64(now or datetime.now(), 'us').astype(np.int64) / 86_400e6
+        return float(2 ** (key - now_days / self.half_life_days))
+    
+    def retained(self) -> List[Dict[str, Any]]:
+        """the retained memories, most important first"""
+        return [memory for _, _, memory in sorted(self._heap, key=lambda entry: (-entry[0], entry[1]))]
+    
+    def compressed(self) -> List[Dict[str, Any]]:
+        """same shape as compress_memories: retained memories + one summary of everything evicted"""
+        result = self.retained()
+        if self.bucket.count:
+            result.append(self.bucket.as_memory())
+        return result
+
 
 # Usage example
-compressor = IntelligentMemoryCompressor()
-
-# Simulate a large memory collection
-large_memory_collection = [
-    {
-        'content': 'User asked about machine learning project deadline',
-        'timestamp': (datetime.now() - timedelta(days=5)).isoformat(),
-        'mention_count': 3
-    },
-    {
-        'content': 'User mentioned they like coffee',
-        'timestamp': (datetime.now() - timedelta(days=20)).isoformat(),
-        'mention_count': 1
-    },
-    # ... many more memories
-]
-
-# Compress intelligently
-optimized_memories = compressor.compress_memories(large_memory_collection)
-print(f"Compressed {len(large_memory_collection)} memories to {len(optimized_memories)} {optimized_memories}")
\ No newline at end of file
+def main():
+    compressor = IntelligentMemoryCompressor()
+
+    # Simulate a large memory collection
+    large_memory_collection = [
+        {
+            'content': 'User asked about machine learning project deadline',
+            'timestamp': (datetime.now() - timedelta(days=5)).isoformat(),
+            'mention_count': 3
+        },
+        {
+            'content': 'User mentioned they like coffee',
+            'timestamp': (datetime.now() - timedelta(days=20)).isoformat(),
+            'mention_count': 1
+        },
+        # ... many more memories
+    ]
+
+    # Compress intelligently
+    optimized_memories = compressor.compress_memories(large_memory_collection)
+    print(f"Compressed {len(large_memory_collection)} memories to {len(optimized_memories)} {optimized_memories}")
+
+    # Or online, memories can come from a generator (e.g. iter_jsonl('memories.jsonl'))
+    stream = StreamingMemoryCompressor(capacity=1)
+    stream.extend(memory for memory in large_memory_collection)
+    print(f"Streaming kept {len(stream)} memories, summarized {stream.bucket.count}: {stream.compressed()}")
+
+
+# (the other scripts here import this file, only run the example when it is run directly)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""Tiered memory lifecycle on top of IntelligentMemoryCompressor's scoring.
+
+Memories live in one of three tiers, roughly following the memory durations in
+LTM/default_entity.py:
+
+- hot:  session memory (hours), plain dicts in RAM, at most `hot_capacity` of them
+- warm: user memory (days-months), gzip compressed JSONL on disk, at most `warm_capacity`
+- cold: domain / relationship memory (months-years+), an archive of summaries, one
+  summary line for every batch of memories that left the warm tier
+
+maintain() (run by the scheduler thread every `interval` seconds, and whenever a tier
+overflows) demotes a memory when it is older than its tier's max age (twice that when
+its importance is above the compressor's importance_threshold) and, when a tier is over
+capacity, the least important memories first. Warm and cold are only ever streamed, so
+RAM use is bounded by hot_capacity (+ a few numbers per warm memory during maintenance)
+no matter how long the history is.
+"""
+import gzip
+import heapq
+import itertools
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from compressor_loader import mem_compressor
+
+
+class TieredMemory:
+    def __init__(self, directory: str = 'tiered_memory', compressor=None,
+                 hot_capacity: int = 1_000, hot_max_age: timedelta = timedelta(hours=6),
+                 warm_capacity: int = 100_000, warm_max_age: timedelta = timedelta(days=90)):
+        self.compressor = compressor or mem_compressor.IntelligentMemoryCompressor()
+        self.hot_capacity = hot_capacity
+        self.hot_max_age = hot_max_age
+        self.warm_capacity = warm_capacity
+        self.warm_max_age = warm_max_age
+
+        os.makedirs(directory, exist_ok=True)
+        self.warm_path = os.path.join(directory, 'warm.jsonl.gz')
+        self.cold_path = os.path.join(directory, 'cold.jsonl')
+
+        self.hot: List[Dict[str, Any]] = []
+        self.warm_count = sum(1 for _ in self._iter_warm())
+        self._lock = threading.RLock()
+        self._scheduler: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    # ---- adding + recall ----
+
+    def add(self, memory: Dict[str, Any]):
+        """new memories always start hot"""
+        with self._lock:
+            self.hot.append(memory)
+            if len(self.hot) > self.hot_capacity:
+                # make room for a tenth of the capacity at once so a full tier isn't rescored on every add
+                self._demote_hot(datetime.now(), overflow=len(self.hot) - self.hot_capacity + self.hot_capacity // 10)
+
+    def recall(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Memories sharing words with the query, tiers are checked in order (hot, warm, cold).
+
+        A colder tier is only read when the warmer ones didn't have `limit` matches.
+        Results are copies with a 'tier' key added.
+        """
+        words = set(query.lower().split())
+        results: List[Dict[str, Any]] = []
+        with self._lock:
+            tiers = (('hot', lambda: iter(self.hot)), ('warm', self._iter_warm), ('cold', self._iter_cold))
+            for tier, memories in tiers:
+                if len(results) >= limit:
+                    break
+                # (overlap, -n) so equal overlaps keep the tier's order
+                scored = ((len(words & set(memory.get('content', '').lower().split())), -n, memory)
+                          for n, memory in enumerate(memories()))
+                best = heapq.nlargest(limit - len(results), (entry for entry in scored if entry[0] > 0),
+                                      key=lambda entry: entry[:2])
+                results += [{**memory, 'tier': tier} for _, _, memory in best]
+        return results
+
+    # ---- lifecycle ----
+
+    def maintain(self, now: Optional[datetime] = None):
+        """one scheduler pass: demote what is too old (or too much) from hot to warm and from warm to cold"""
+        now = now or datetime.now()
+        with self._lock:
+            self._demote_hot(now)
+            self._demote_warm(now)
+
+    def start(self, interval: float = 3600.0):
+        """run maintain() every `interval` seconds in a background thread"""
+        if self._scheduler is not None:
+            return
+        self._stopped.clear()
+
+        def loop():
+            while not self._stopped.wait(interval):
+                self.maintain()
+
+        self._scheduler = threading.Thread(target=loop, name='memory-tiers', daemon=True)
+        self._scheduler.start()
+
+    def close(self):
+        """stop the scheduler and move the hot tier to disk so nothing is lost"""
+        self._stopped.set()
+        if self._scheduler is not None:
+            self._scheduler.join()
+            self._scheduler = None
+        with self._lock:
+            if self.hot:
+                self._append_warm(self.hot)
+                self.hot = []
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            cold = sum(1 for _ in self._iter_cold())
+            return {'hot': len(self.hot), 'warm': self.warm_count, 'cold_summaries': cold}
+
+    def _demote_mask(self, memories: Iterable[Dict[str, Any]], now: datetime, max_age: timedelta, overflow: int) -> np.ndarray:
+        """which memories leave the tier: too old, plus the `overflow` least important of the rest.
+
+        The memories are scored in chunks, only the scores and timestamps are kept.
+        """
+        scores, timestamps = [np.empty(0)], [np.empty(0, dtype='datetime64[us]')]
+        memories = iter(memories)
+        while True:
+            chunk = list(itertools.islice(memories, 10_000))
+            if not chunk:
+                break
+            scores.append(self.compressor.score_memories(chunk, now=now))
+            timestamps.append(self.compressor._parse_timestamps([memory['timestamp'] for memory in chunk]))
+        scores, timestamps = np.concatenate(scores), np.concatenate(timestamps)
+
+        ages = np.datetime64(now, 'us') - timestamps
+        max_age = np.timedelta64(max_age, 'us')
+        important = scores >= self.compressor.compression_rules['importance_threshold']
+        demote = ages > np.where(important, 2 * max_age, max_age)
+
+        extra = overflow - int(demote.sum())
+        if extra > 0:
+            staying = np.flatnonzero(~demote)
+            demote[staying[np.argsort(scores[staying], kind='stable')[:extra]]] = True
+        return demote
+
+    def _demote_hot(self, now: datetime, overflow: int = 0):
+        if not self.hot:
+            return
+        demote = self._demote_mask(self.hot, now, self.hot_max_age, max(overflow, len(self.hot) - self.hot_capacity))
+        if demote.any():
+            self._append_warm([memory for memory, leaves in zip(self.hot, demote) if leaves])
+            self.hot = [memory for memory, leaves in zip(self.hot, demote) if not leaves]
+        if self.warm_count > self.warm_capacity:
+            self._demote_warm(now, overflow=self.warm_count - self.warm_capacity + self.warm_capacity // 10)
+
+    def _demote_warm(self, now: datetime, overflow: int = 0):
+        """rewrite the warm file without the demoted memories, they become one cold summary"""
+        if not self.warm_count:
+            return
+        # the warm file is streamed twice, once to decide and once to rewrite it
+        demote = self._demote_mask(self._iter_warm(), now, self.warm_max_age, max(overflow, self.warm_count - self.warm_capacity))
+        if not demote.any():
+            return
+
+        bucket = mem_compressor.SummaryBucket()
+        first = last = None
+        tmp_path = self.warm_path + '.tmp'
+        with gzip.open(tmp_path, 'wt') as kept:
+            for memory, leaves in zip(self._iter_warm(), demote):
+                if leaves:
+                    bucket.add(memory)
+                    first = min(first or memory['timestamp'], memory['timestamp'])
+                    last = max(last or memory['timestamp'], memory['timestamp'])
+                else:
+                    kept.write(json.dumps(memory) + '\n')
+        os.replace(tmp_path, self.warm_path)
+        self.warm_count -= bucket.count
+
+        summary = bucket.as_memory()
+        summary['period'] = [first, last]
+        with open(self.cold_path, 'a') as f:
+            f.write(json.dumps(summary) + '\n')
+
+    # ---- storage ----
+
+    def _append_warm(self, memories: List[Dict[str, Any]]):
+        # appending to a gzip file adds another gzip member, readers see one stream
+        with gzip.open(self.warm_path, 'at') as f:
+            for memory in memories:
+                f.write(json.dumps(memory) + '\n')
+        self.warm_count += len(memories)
+
+    def _iter_warm(self) -> Iterator[Dict[str, Any]]:
+        if os.path.exists(self.warm_path):
+            with gzip.open(self.warm_path, 'rt') as f:
+                for line in f:
+                    yield json.loads(line)
+
+    def _iter_cold(self) -> Iterator[Dict[str, Any]]:
+        if os.path.exists(self.cold_path):
+            with open(self.cold_path) as f:
+                for line in f:
+                    yield json.loads(line)
+
+
+# Usage example
+def main():
+    tiers = TieredMemory('tiered_memory_example', hot_capacity=2, warm_capacity=2)
+    for days, content in [(200, 'User planned a trip to Japan'), (40, 'User asked about python deadlines'),
+                          (3, 'User mentioned their coffee preference'), (0, 'User has an urgent project problem')]:
+        tiers.add({'content': content, 'timestamp': (datetime.now() - timedelta(days=days)).isoformat(), 'mention_count': 1})
+    tiers.maintain()
+    print(tiers.stats())
+    print(tiers.recall('project deadlines japan'))
+    tiers.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence
+
+from langchain_core.chat_history import BaseChatMessageHistory, InMemoryChatMessageHistory
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+# rough per message overhead (message object, type, ids) on top of its content
+MESSAGE_OVERHEAD_BYTES = 200
+
+
+class LeasedHistory(BaseChatMessageHistory):
+    """What get() hands out: the session's history, plus a lease that keeps it from being
+    evicted until the turn writes its messages back (RunnableWithMessageHistory fetches the
+    history before the LLM call and adds the new messages after it)."""
+
+    def __init__(self, store: 'SessionHistoryStore', session_id: str, history: BaseChatMessageHistory):
+        self.store = store
+        self.session_id = session_id
+        self.history = history
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return self.history.messages
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        if not self.store._write_back(self.session_id, self.history, messages):
+            # evicted anyway (the lease ran out), write to the session as it lives now so nothing is lost
+            self.history = self.store.get(self.session_id).history
+            self.store._write_back(self.session_id, self.history, messages)
+
+    def clear(self) -> None:
+        self.history.clear()
+
+
+class SessionHistoryStore:
+    """Chat histories per session id, bounded in sessions and bytes.
+
+    Sessions are kept in LRU order. get() evicts sessions idle for longer than
+    `ttl_seconds`, then least recently used ones while there are more than `max_sessions`
+    or their messages take more than `max_bytes` (approximate: content length + a fixed
+    overhead per message). With `spill_dir` an evicted session is written to disk and
+    rehydrated the next time its id shows up, otherwise it's dropped.
+
+    A session whose history was handed out and hasn't had the turn's messages added yet
+    is in use and not evicted (for at most `lease_seconds`, in case the turn never writes).
+    """
+
+    def __init__(self, max_sessions: int = 10_000, ttl_seconds: Optional[float] = 3600.0,
+                 max_bytes: int = 64 * 1024 * 1024, spill_dir: Optional[str] = None,
+                 history_factory: Callable[[], BaseChatMessageHistory] = InMemoryChatMessageHistory,
+                 lease_seconds: float = 300.0):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.history_factory = history_factory
+        self.lease_seconds = lease_seconds
+        self.max_busy_skips = 64
+
+        self._sessions: 'OrderedDict[str, BaseChatMessageHistory]' = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        self._sizes: Dict[str, tuple] = {}  # session id -> (bytes, messages counted)
+        self._handed_out = set()  # sessions that may have grown since their size was counted
+        self._leases: Dict[str, list] = {}  # session id -> [turns in flight, when the latest started]
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+        self.metrics = {'hits': 0, 'misses': 0, 'rehydrated': 0, 'spilled': 0,
+                        'evicted_ttl': 0, 'evicted_lru': 0, 'evicted_bytes': 0}
+
+    def get(self, session_id: str) -> LeasedHistory:
+        with self._lock:
+            now = time.monotonic()
+            self._count_sizes()
+            history = self._sessions.get(session_id)
+            if history is not None:
+                self.metrics['hits'] += 1
+                self._sessions.move_to_end(session_id)
+            else:
+                self.metrics['misses'] += 1
+                history = self._rehydrate(session_id)
+                if history is None:
+                    history = self.history_factory()
+                self._sessions[session_id] = history
+                self._sizes[session_id] = (0, 0)
+            self._last_access[session_id] = now
+            self._handed_out.add(session_id)
+            lease = self._leases.setdefault(session_id, [0, now])
+            lease[0] += 1
+            lease[1] = now
+            self._evict(now)
+            return LeasedHistory(self, session_id, history)
+
+    __getitem__ = get
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.metrics['hits'] + self.metrics['misses']
+        return self.metrics['hits'] / lookups if lookups else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            self._count_sizes()
+        return {**self.metrics, 'sessions': len(self._sessions), 'bytes': self.total_bytes, 'hit_rate': self.hit_rate}
+
+    def evict_expired(self):
+        """drop idle sessions now (get() does this too, call it from a timer when traffic is low)"""
+        with self._lock:
+            self._count_sizes()
+            self._evict(time.monotonic())
+
+    # ---- internals ----
+
+    def _count_sizes(self):
+        # messages get appended after get() returned the history, only the new ones are counted
+        for session_id in self._handed_out:
+            if session_id not in self._sessions:
+                continue
+            size, counted = self._sizes[session_id]
+            messages = self._sessions[session_id].messages
+            if len(messages) < counted:  # history was cleared, count it again
+                self.total_bytes -= size
+                size, counted = 0, 0
+            added = sum(len(str(message.content)) + MESSAGE_OVERHEAD_BYTES for message in messages[counted:])
+            self._sizes[session_id] = (size + added, len(messages))
+            self.total_bytes += added
+        self._handed_out.clear()
+
+    def _write_back(self, session_id: str, history: BaseChatMessageHistory, messages: Sequence[BaseMessage]) -> bool:
+        """add a turn's messages and end its lease, returns False when `history` isn't the session's live history anymore"""
+        with self._lock:
+            if self._sessions.get(session_id) is not history:
+                return False
+            history.add_messages(messages)
+            lease = self._leases.get(session_id)
+            if lease is not None:
+                lease[0] -= 1
+                if lease[0] <= 0:
+                    del self._leases[session_id]
+            self._handed_out.add(session_id)  # count the new messages on the next get()
+            return True
+
+    def _in_use(self, session_id: str, now: float) -> bool:
+        lease = self._leases.get(session_id)
+        return lease is not None and now - lease[1] <= self.lease_seconds
+
+    def _evict(self, now: float):
+        victims, skipped = [], 0
+        sessions, total_bytes = len(self._sessions), self.total_bytes
+        # LRU order is access order: idle sessions are all at the front, and so are the ones
+        # to drop when over budget, the walk stops at the first session that may stay
+        for session_id in self._sessions:
+            expired = self.ttl_seconds is not None and now - self._last_access[session_id] > self.ttl_seconds
+            over_sessions = sessions > self.max_sessions
+            if not (expired or over_sessions or total_bytes > self.max_bytes):
+                break
+            if self._in_use(session_id, now):
+                # its turn hasn't written back yet, don't walk past every busy session each time
+                skipped += 1
+                if skipped > self.max_busy_skips:
+                    break
+                continue
+            victims.append((session_id, 'evicted_ttl' if expired else 'evicted_lru' if over_sessions else 'evicted_bytes'))
+            sessions -= 1
+            total_bytes -= self._sizes[session_id][0]
+        for session_id, reason in victims:
+            self._remove(session_id, reason)
+
+    def _remove(self, session_id: str, reason: str):
+        history = self._sessions.pop(session_id)
+        del self._last_access[session_id]
+        self.total_bytes -= self._sizes.pop(session_id)[0]
+        self._handed_out.discard(session_id)
+        self._leases.pop(session_id, None)
+        self.metrics[reason] += 1
+        if self.spill_dir is not None and history.messages:
+            self._spill(session_id, history)
+
+    def _spill_path(self, session_id: str) -> str:
+        return os.path.join(self.spill_dir, hashlib.sha1(session_id.encode()).hexdigest() + '.json')
+
+    def _spill(self, session_id: str, history: BaseChatMessageHistory):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = self._spill_path(session_id)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'session_id': session_id, 'messages': messages_to_dict(history.messages)}, f)
+        os.replace(path + '.tmp', path)
+        self.metrics['spilled'] += 1
+
+    def _rehydrate(self, session_id: str) -> Optional[BaseChatMessageHistory]:
+        if self.spill_dir is None:
+            return None
+        path = self._spill_path(session_id)
+        try:
+            with open(path) as f:
+                spilled = json.load(f)
+        except FileNotFoundError:
+            return None
+        os.remove(path)  # the session lives in memory again, it gets spilled anew when evicted
+        history = self.history_factory()
+        history.add_messages(messages_from_dict(spilled['messages']))
+        self.metrics['rehydrated'] += 1
+        return history
@@ -0,0 +1,253 @@
+import os
+import struct
+import time
+from typing import Any, Dict, List, Optional
+
+MAGIC = b'UPAT'
+VERSION = 2
+# length pref, complexity, duration mean, duration var, sessions, version, ring head, ring size
+_HEADER = struct.Struct('<IIffIIHH')
+_VERSION_OFFSET = struct.calcsize('<IIffI')
+
+
+class UserPatternStore:
+    """Interaction patterns of many users in one packed bytearray.
+
+    Every user is a fixed size record (220 bytes with the defaults) in a shared arena:
+    response length / complexity preference as ids into a shared string table,
+    exponentially decayed session duration mean + variance, a ring buffer of the last
+    `ring_size` interaction times (epoch seconds) and `topic_slots` heavy-hitter topic
+    counters (Space-Saving: a new topic replaces the least counted one and inherits its
+    count, so frequent topics are never lost). Every update touches a fixed number of
+    bytes, no matter how many interactions a user had. A per-user version goes up
+    whenever an update changes something patterns() returns (other than the times).
+
+    Strings (preferences, topics) are interned with a reference count per record field or
+    topic slot that holds them. When Space-Saving replaces a topic, or a preference changes,
+    the old string is released. Once nothing refers to it, its id gets reused, so the table
+    stays bounded by what is stored rather than by every topic ever seen.
+
+    save()/load() write the arena as is, plus the string table and user ids.
+    """
+
+    def __init__(self, ring_size: int = 16, topic_slots: int = 16, decay: float = 0.2):
+        self.ring_size = ring_size
+        self.topic_slots = topic_slots
+        self.decay = decay  # weight of the newest session duration
+        self.record_size = _HEADER.size + 4 * ring_size + 8 * topic_slots
+        self._ring_offset = _HEADER.size
+        self._topics_offset = _HEADER.size + 4 * ring_size
+        self._topics = struct.Struct(f'<{2 * topic_slots}I')
+
+        self.arena = bytearray()
+        self.users: Dict[str, int] = {}  # user id -> record number
+        self.strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+        self._refs: List[int] = []  # per string id, 0 = free
+        self._free: List[int] = []
+        self._default_length = self.intern('medium')
+        self._default_complexity = self.intern('intermediate')
+        # the defaults stay, every new record points at them
+        self._refs[self._default_length] += 1
+        self._refs[self._default_complexity] += 1
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self.users
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    def intern(self, value: str) -> int:
+        """id of a string, new strings take a freed id when there is one (callers take a reference with _acquire)"""
+        if value not in self._string_ids:
+            if self._free:
+                number = self._free.pop()
+                self.strings[number] = value
+            else:
+                number = len(self.strings)
+                self.strings.append(value)
+                self._refs.append(0)
+            self._string_ids[value] = number
+        return self._string_ids[value]
+
+    def _acquire(self, value: str) -> int:
+        number = self.intern(value)
+        self._refs[number] += 1
+        return number
+
+    def _release(self, number: int):
+        self._refs[number] -= 1
+        if self._refs[number] == 0:
+            del self._string_ids[self.strings[number]]
+            self.strings[number] = ''
+            self._free.append(number)
+
+    def _record(self, user_id: str) -> int:
+        """byte offset of the user's record, created with the defaults on first use"""
+        number = self.users.get(user_id)
+        if number is None:
+            number = self.users[user_id] = len(self.users)
+            self.arena += bytes(self.record_size)
+            self._refs[self._default_length] += 1
+            self._refs[self._default_complexity] += 1
+            _HEADER.pack_into(self.arena, number * self.record_size,
+                              self._default_length, self._default_complexity, 0.0, 0.0, 0, 0, 0, 0)
+        return number * self.record_size
+
+    # ---- updates, all O(1) ----
+
+    def update(self, user_id: str, interaction_data: Dict[str, Any]) -> bool:
+        """apply one interaction, returns whether anything that shows up in patterns() changed"""
+        created = user_id not in self.users
+        offset = self._record(user_id)
+        length, complexity, mean, variance, sessions, version, head, size = _HEADER.unpack_from(self.arena, offset)
+        before = (length, complexity, mean)
+
+        if 'response_length_preference' in interaction_data:
+            new_length = self._acquire(interaction_data['response_length_preference'])
+            self._release(length)
+            length = new_length
+        if 'complexity_preference' in interaction_data:
+            new_complexity = self._acquire(interaction_data['complexity_preference'])
+            self._release(complexity)
+            complexity = new_complexity
+        if 'session_duration' in interaction_data:
+            # same moving average as before (new = 0.8 old + 0.2 latest) plus a decayed variance
+            delta = interaction_data['session_duration'] - mean
+            mean += self.decay * delta
+            variance = (1 - self.decay) * (variance + self.decay * delta * delta)
+            sessions += 1
+
+        # ring buffer of interaction times, the oldest gets overwritten
+        struct.pack_into('<I', self.arena, offset + self._ring_offset + 4 * head,
+                         int(interaction_data.get('timestamp', time.time())))
+        head, size = (head + 1) % self.ring_size, min(size + 1, self.ring_size)
+        _HEADER.pack_into(self.arena, offset, length, complexity, mean, variance, sessions, version, head, size)
+        # (mean is compared after the float32 round trip, that's what patterns() reads)
+        changed = created or before != _HEADER.unpack_from(self.arena, offset)[:3]
+
+        for topic in interaction_data.get('topics', ()):
+            changed |= self._count_topic(offset, topic)
+        if changed:
+            struct.pack_into('<I', self.arena, offset + _VERSION_OFFSET, (version + 1) & 0xFFFFFFFF)
+        return changed
+
+    def _count_topic(self, offset: int, topic: str) -> bool:
+        """Space-Saving update, returns whether the top topics list may have changed"""
+        start = offset + self._topics_offset
+        slots = self._topics.unpack_from(self.arena, start)
+        ids, counts = slots[0::2], slots[1::2]
+        known = self._string_ids.get(topic)
+        key = known + 1 if known is not None else 0  # 0 marks an empty slot
+        if key and key in ids:
+            slot = ids.index(key)
+            count = counts[slot] + 1
+        elif 0 in ids:
+            slot, count = ids.index(0), 1
+            key = self._acquire(topic) + 1
+        else:
+            slot = counts.index(min(counts))
+            count = counts[slot] + 1
+            # take the new topic's reference first, so releasing the old one can't hand out its id twice
+            key = self._acquire(topic) + 1
+            self._release(ids[slot] - 1)
+        struct.pack_into('<II', self.arena, start + 8 * slot, key, count)
+        # a count going up only changes the top list when it passes (or joins) the top 5
+        return key not in ids or sorted(counts, reverse=True)[:5][-1] <= count
+
+    # ---- reads ----
+
+    def version(self, user_id: str) -> int:
+        """changes every time the user's patterns do, 0 for unknown users"""
+        if user_id not in self.users:
+            return 0
+        return struct.unpack_from('<I', self.arena, self.users[user_id] * self.record_size + _VERSION_OFFSET)[0]
+
+    def top_topics(self, user_id: str, limit: int = 5) -> List[str]:
+        if user_id not in self.users:
+            return []
+        slots = self._topics.unpack_from(self.arena, self._record(user_id) + self._topics_offset)
+        used = [(count, -slot, key) for slot, (key, count) in enumerate(zip(slots[0::2], slots[1::2])) if key]
+        return [self.strings[key - 1] for _, _, key in sorted(used, reverse=True)[:limit]]
+
+    def interaction_times(self, user_id: str) -> List[int]:
+        """oldest first"""
+        if user_id not in self.users:
+            return []
+        offset = self._record(user_id)
+        *_, head, size = _HEADER.unpack_from(self.arena, offset)
+        ring = struct.unpack_from(f'<{self.ring_size}I', self.arena, offset + self._ring_offset)
+        start = (head - size) % self.ring_size
+        return [ring[(start + i) % self.ring_size] for i in range(size)]
+
+    def patterns(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """the user's patterns as a plain dict (same keys as the old user_patterns entries)"""
+        if user_id not in self.users:
+            return None
+        length, complexity, mean, variance, sessions, _, _, _ = _HEADER.unpack_from(self.arena, self._record(user_id))
+        return {
+            'preferred_response_length': self.strings[length],
+            'typical_session_duration': mean,
+            'session_duration_variance': variance,
+            'sessions': sessions,
+            'common_topics': self.top_topics(user_id),
+            'interaction_times': self.interaction_times(user_id),
+            'complexity_preference': self.strings[complexity],
+        }
+
+    # ---- persistence ----
+
+    def save(self, path: str):
+        """binary file: header, string table, user ids, then the arena as is"""
+        def text(value: str) -> bytes:
+            data = value.encode()
+            return struct.pack('<I', len(data)) + data
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC + struct.pack('<HHHfII', VERSION, self.ring_size, self.topic_slots, self.decay,
+                                        len(self.strings), len(self.users)))
+            f.writelines(text(value) for value in self.strings)
+            # dicts keep insertion order = record order
+            f.writelines(text(user_id) for user_id in self.users)
+            f.write(self.arena)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'UserPatternStore':
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:4] != MAGIC:
+            raise ValueError(f'{path} is not a user pattern file')
+        version, ring_size, topic_slots, decay, string_count, user_count = struct.unpack_from('<HHHfII', data, 4)
+        if version != VERSION:
+            raise ValueError(f'unsupported user pattern file version {version}')
+        store = cls(ring_size=ring_size, topic_slots=topic_slots, decay=decay)
+
+        position = 4 + struct.calcsize('<HHHfII')
+
+        def text():
+            nonlocal position
+            (length,) = struct.unpack_from('<I', data, position)
+            position += 4 + length
+            return data[position - length:position].decode()
+
+        store.strings = [text() for _ in range(string_count)]
+        store.users = {text(): number for number in range(user_count)}
+        store.arena = bytearray(data[position:position + user_count * store.record_size])
+
+        # reference counts aren't saved, count what the records point at
+        store._refs = [0] * string_count
+        store._refs[store._default_length] += 1
+        store._refs[store._default_complexity] += 1
+        for number in range(user_count):
+            offset = number * store.record_size
+            length, complexity = _HEADER.unpack_from(store.arena, offset)[:2]
+            store._refs[length] += 1
+            store._refs[complexity] += 1
+            for key in store._topics.unpack_from(store.arena, offset + store._topics_offset)[0::2]:
+                if key:
+                    store._refs[key - 1] += 1
+        store._string_ids = {value: number for number, value in enumerate(store.strings) if store._refs[number]}
+        store._free = [number for number, refs in enumerate(store._refs) if not refs]
+        return store
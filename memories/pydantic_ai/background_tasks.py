@@ -0,0 +1,54 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundPipeline:
+    """Runs work that doesn't have to finish before we answer (saving, enrichment) in the background.
+
+    At most `concurrency` jobs run at once and at most `max_pending` wait in the queue. When
+    the queue is full `submit` waits for a free slot, that backpressure is what keeps a burst
+    of turns from piling up unbounded work and memory.
+    """
+
+    def __init__(self, concurrency: int = 4, max_pending: int = 256):
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    async def submit(self, job: Callable[[], Awaitable[None]]):
+        """Schedule `job()`, only waits when `max_pending` jobs are already queued"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        await self._queue.put(job)
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await job()
+            except Exception:
+                logger.exception('background job failed')
+            finally:
+                self._queue.task_done()
+
+    async def flush(self):
+        """Wait for every job submitted so far"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def aclose(self):
+        await self.flush()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
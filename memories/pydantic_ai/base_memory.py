@@ -1,30 +1,46 @@
 from pydantic_ai import Agent
-from pydantic_ai.messages import ModelMessage , ModelRequest , ModelResponse
-from typing import List
+from pydantic_ai.messages import ModelMessage
+from typing import List, Optional
+from message_history import MessageHistory, message_text
+from conversation_topics import TopicTracker
 
 class ConversationManager:
-    def __init__(self):
-        self.agent = Agent('openai:gpt-4', system_prompt="You are a manica bot.")
-        self.conversation_history: List[ModelMessage] = []
+    def __init__(self, agent: Optional[Agent] = None):
+        # an agent holds no conversation state, many managers can share one (see ConversationPool)
+        self.agent = agent or Agent('openai:gpt-4', system_prompt="You are a manica bot.")
+        # pinned first message + deque, a turn only appends its new messages
+        self.conversation_history = MessageHistory()
+        # topics of the recent messages, plus where in the conversation they came up
+        self.topics = TopicTracker()
 
     async def chat(self, user_input: str) -> str:
 
          # Let the Agent create and append the user part based on the string
-        result = await self.agent.run(user_input, message_history=self.conversation_history)
+        result = await self.agent.run(user_input, message_history=self.conversation_history.messages())
         
-        # Save all messages returned (user + assistant)
-        self.conversation_history = result.all_messages()        
+        # Save the messages this turn added (user + assistant), the rest is already there
+        new_messages = result.new_messages()
+        offset = self.conversation_history.added
+        self.conversation_history.extend(new_messages)
+        for position, message in enumerate(new_messages, offset):
+            self.topics.add(message_text(message, system_prompt=False), position)
 
         return result.output
 
     def get_conversation_summary(self) -> dict:
+        # all kept up to date as messages come in, nothing here walks the history
         return {
         "total_messages": len(self.conversation_history),
-        "user_messages": len([m for m in self.conversation_history if isinstance(m, ModelRequest)]),
-        "assistant_messages": len([m for m in self.conversation_history if isinstance(m, ModelResponse)]),
+        "user_messages": self.conversation_history.requests,
+        "assistant_messages": self.conversation_history.responses,
         "recent_topics": self._extract_recent_topics()
         }
 
     def _extract_recent_topics(self) -> List[str]:
-        return ["hiking", "camping trip"]  # stub for now
+        return self.topics.top(5)
+
+    def messages_about(self, topic: str) -> List[ModelMessage]:
+        """the latest messages that mention a topic (the ones still in the history)"""
+        found = (self.conversation_history.message_at(offset) for offset in self.topics.offsets(topic))
+        return [message for message in found if message is not None]
 
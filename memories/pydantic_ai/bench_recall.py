@@ -0,0 +1,99 @@
+"""Recall@k / latency benchmark: keyword scorer vs embedding recall (exact and IVF).
+
+Synthetic memories are built from topic vocabularies, every query is a shuffled half of one
+memory plus a couple of unrelated words. recall@k = how often that source memory shows up
+in the top k. For IVF we also report recall@k against the exact cosine top k.
+
+    python bench_recall.py --memories 100000 --queries 200
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from memory_embeddings import HashingEmbedder, VectorIndex
+from memory_index import KeywordIndex
+
+
+def make_memories(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    topics = [[f't{t}w{w}' for w in range(15)] for t in range(200)]
+    common = [f'c{w}' for w in range(300)]
+    memories = []
+    for _ in range(n):
+        topic = rng.choice(topics)
+        words = rng.sample(topic, 6) + rng.sample(common, 4)
+        rng.shuffle(words)
+        memories.append(' '.join(words))
+    return memories
+
+
+def make_queries(memories, count: int, seed: int = 1):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        target = rng.randrange(len(memories))
+        words = memories[target].split()
+        rng.shuffle(words)
+        queries.append((target, ' '.join(words[:len(words) // 2] + [f'noise{rng.randrange(1000)}' for _ in range(2)])))
+    return queries
+
+
+def percentile(values, p):
+    return float(np.percentile(np.array(values) * 1000, p))
+
+
+def run(name, search, queries, k):
+    hits, latencies, results = 0, [], []
+    for target, query in queries:
+        start = time.perf_counter()
+        found = [position for _, position in search(query)]
+        latencies.append(time.perf_counter() - start)
+        hits += target in found[:k]
+        results.append(found)
+    print(f'{name:<10} recall@{k}={hits / len(queries):.3f}  p50={percentile(latencies, 50):.2f}ms  p95={percentile(latencies, 95):.2f}ms')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--memories', type=int, default=50_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--nprobe', type=int, default=8)
+    args = parser.parse_args()
+
+    memories = make_memories(args.memories)
+    queries = make_queries(memories, args.queries)
+    embedder = HashingEmbedder()
+
+    start = time.perf_counter()
+    keyword = KeywordIndex()
+    for position, content in enumerate(memories):
+        keyword.add(position, 'user', content, [], 0.5)
+    print(f'keyword index built in {time.perf_counter() - start:.1f}s')
+
+    start = time.perf_counter()
+    vectors = VectorIndex(embedder.dim, ivf_threshold=None, nprobe=args.nprobe)
+    for first in range(0, len(memories), 4096):
+        embeddings = embedder.embed(memories[first:first + 4096])
+        for offset, vector in enumerate(embeddings):
+            vectors.add(first + offset, 'user', vector)
+    print(f'embeddings built in {time.perf_counter() - start:.1f}s')
+
+    start = time.perf_counter()
+    vectors.build_ivf('user')
+    print(f'ivf built in {time.perf_counter() - start:.1f}s')
+
+    k = args.k
+    run('keyword', lambda q: keyword.search('user', q, k), queries, k)
+    exact = run('exact', lambda q: vectors.search('user', embedder.embed([q])[0], k, exact=True), queries, k)
+    approx = run('ivf', lambda q: vectors.search('user', embedder.embed([q])[0], k), queries, k)
+
+    overlap = np.mean([len(set(a) & set(e)) / max(1, len(e)) for a, e in zip(approx, exact)])
+    print(f'ivf recall@{k} vs exact: {overlap:.3f}')
+
+
+if __name__ == '__main__':
+    main()
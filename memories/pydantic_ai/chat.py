@@ -1,16 +1,22 @@
 import asyncio
-from base_memory import ConversationManager  # make sure the filename matches
+from session_pool import ConversationPool  # make sure the filename matches
 
-chat_manager = ConversationManager()
+# one manager per user, all sharing one agent, idle sessions spilled to disk
+chat_pool = ConversationPool(spill_dir="chat_sessions")
 
 async def main():
-    response1 = await chat_manager.chat("Hi, I'm planning a camping trip")
+    # turns of the same user run in order, different users at the same time
+    response1, other = await asyncio.gather(
+        chat_pool.chat("user_1", "Hi, I'm planning a camping trip"),
+        chat_pool.chat("user_2", "Can you recommend a book about sailing?"),
+    )
     print(response1)
 
-    response2 = await chat_manager.chat("What should I pack?")
+    response2 = await chat_pool.chat("user_1", "What should I pack?")
     print(response2)
 
-    print(chat_manager.get_conversation_summary())
+    print(chat_pool.get("user_1").get_conversation_summary())
+    print(chat_pool.stats())
     
 
 if __name__ == "__main__":
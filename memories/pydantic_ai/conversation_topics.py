@@ -0,0 +1,101 @@
+import re
+from typing import Dict, List
+
+WORD = re.compile(r"[a-z][a-z0-9'+-]*")
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between both but by
+can could did do does doing don done down during each even few for from further get got had has have having he her
+here hers him his how i if in into is it its just know let like me more most my no nor not now of off on once only
+or other our out over own really same she should so some such than that the their them then there these they this
+those through to too under until up very want was we well were what when where which while who whom why will with
+would yes you your i'm it's that's what's can't don't let's thanks thank hi hello hey ok okay sure please tell help need think make
+""".split())
+
+
+class TopicTracker:
+    """Topics of the recent conversation from word and word pair counts, no LLM involved.
+
+    Every message adds 1 to each of its words (1.5 to each pair of neighbouring words,
+    "camping trip" says more than "camping" and "trip") and older counts fade with a
+    half life of `half_life` messages. Instead of decaying every count on every message
+    the increments grow (a fade applies to all counts alike, so only the scale changes),
+    which keeps add() proportional to the message length. The `limit` best topics are
+    kept up to date as counts change, top() just sorts those few.
+
+    index maps a topic to the offsets of the last `index_size` messages that mention it.
+    """
+
+    def __init__(self, half_life: float = 20.0, limit: int = 10, index_size: int = 50,
+                 prune_every: int = 200, min_score: float = 0.05):
+        self.growth = 2 ** (1 / half_life)
+        self.limit = limit
+        self.index_size = index_size
+        self.prune_every = prune_every
+        self.min_score = min_score
+
+        self.scores: Dict[str, float] = {}  # in units of the current increment scale
+        self.index: Dict[str, List[int]] = {}  # lists, a deque per term costs ~600 bytes even when empty
+        self._top: Dict[str, float] = {}
+        self._weight = 1.0
+        self._messages = 0
+
+    @staticmethod
+    def terms(text: str) -> Dict[str, float]:
+        words = [word.strip("'-") for word in WORD.findall(text.lower())]
+        words = [word if len(word) > 2 and word not in STOPWORDS else None for word in words]
+        found = {word: 1.0 for word in words if word}
+        for first, second in zip(words, words[1:]):
+            if first and second and first != second:
+                found[f'{first} {second}'] = 1.5
+        return found
+
+    def add(self, text: str, offset: int):
+        """count the topics of the message at `offset`"""
+        self._messages += 1
+        self._weight *= self.growth
+        for term, weight in self.terms(text).items():
+            score = self.scores[term] = self.scores.get(term, 0.0) + weight * self._weight
+            offsets = self.index.setdefault(term, [])
+            offsets.append(offset)
+            if len(offsets) > 2 * self.index_size:  # trimmed in bulk, amortized O(1)
+                del offsets[:-self.index_size]
+            self._update_top(term, score)
+
+        if self._weight > 1e100:
+            self._rescale()
+        if self._messages % self.prune_every == 0:
+            self._prune()
+
+    def _update_top(self, term: str, score: float):
+        # every count fades alike, so the order of counts that didn't change stays the same
+        # and a term only has to be checked against the current top when its own count goes up
+        if term in self._top or len(self._top) < self.limit:
+            self._top[term] = score
+            return
+        lowest = min(self._top, key=self._top.get)
+        if score > self._top[lowest]:
+            del self._top[lowest]
+            self._top[term] = score
+
+    def _rescale(self):
+        self.scores = {term: score / self._weight for term, score in self.scores.items()}
+        self._top = {term: score / self._weight for term, score in self._top.items()}
+        self._weight = 1.0
+
+    def _prune(self):
+        """forget topics that faded below min_score (and their index), keeps the tracker to the recent window"""
+        cutoff = self.min_score * self._weight
+        for term in [term for term, score in self.scores.items() if score < cutoff and term not in self._top]:
+            del self.scores[term]
+            del self.index[term]
+
+    def top(self, limit: int = 5) -> List[str]:
+        return sorted(self._top, key=self._top.get, reverse=True)[:limit]
+
+    def score(self, term: str) -> float:
+        """decayed count, as of the latest message"""
+        return self.scores.get(term, 0.0) / self._weight
+
+    def offsets(self, topic: str) -> List[int]:
+        """offsets of the latest messages about a topic, oldest first"""
+        return self.index.get(topic.lower(), [])[-self.index_size:]
@@ -0,0 +1,56 @@
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class LazyMemoryList:
+    """Memory store that keeps the raw records from storage and validates an entry the first time it's used.
+
+    Loading only parses the file, no pydantic validation and no objects per memory, so
+    startup is just the json parse. Appended memories are already validated entries.
+    """
+
+    def __init__(self, records: Iterable[Dict[str, Any]], entry_factory: Callable[..., Any]):
+        self.entry_factory = entry_factory
+        self._items: List[Any] = list(records)  # raw dict until first access, entry afterwards
+        self._users: Dict[str, List[int]] = {}
+        for position, item in enumerate(self._items):
+            self._users.setdefault(item['user_id'], []).append(position)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, position: int) -> Any:
+        item = self._items[position]
+        if isinstance(item, dict):
+            item = self._items[position] = self.entry_factory(**item)
+        return item
+
+    def __iter__(self) -> Iterator[Any]:
+        for position in range(len(self._items)):
+            yield self[position]
+
+    def append(self, entry: Any) -> int:
+        position = len(self._items)
+        self._users.setdefault(entry.user_id, []).append(position)
+        self._items.append(entry)
+        return position
+
+    def user_positions(self, user_id: str) -> List[int]:
+        return self._users.get(user_id, [])
+
+    def index_fields(self, positions: Optional[Iterable[int]] = None) -> Iterator[Tuple[int, str, str, List[str], float]]:
+        """(position, user_id, content, topics, importance) without validating anything"""
+        for position in (range(len(self._items)) if positions is None else positions):
+            item = self._items[position]
+            if isinstance(item, dict):
+                yield position, item['user_id'], item['content'], item.get('topics') or [], float(item.get('importance_score', 0.5))
+            else:
+                yield position, item.user_id, item.content, item.topics, item.importance_score
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """Everything as plain records for a full save, entries that were never accessed stay unvalidated"""
+        for item in self._items:
+            yield item if isinstance(item, dict) else item.model_dump(mode='json')
+
+    @property
+    def validated(self) -> int:
+        return sum(not isinstance(item, dict) for item in self._items)
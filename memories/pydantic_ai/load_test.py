@@ -0,0 +1,79 @@
+"""Load test for ConversationPool with many concurrent sessions.
+
+Every session is a user sending `--turns` messages one after the other, all sessions run
+at once. The model is a stub (pydantic-ai's FunctionModel answering after `--latency`
+seconds), so this measures the pool and history handling, not an LLM. Reports turns/sec,
+the resident memory and what the pool evicted / spilled under the memory budget.
+
+    python load_test.py --sessions 10000 --turns 5 --max-mb 64
+"""
+import argparse
+import asyncio
+import resource
+import sys
+import tempfile
+import time
+
+
+def rss_mb() -> float:
+    """current resident set size (peak on systems without /proc)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except FileNotFoundError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+async def run(sessions: int, turns: int, latency: float, max_mb: float, spill_dir: str):
+    from pydantic_ai import Agent
+    from pydantic_ai.messages import ModelResponse, TextPart
+    from pydantic_ai.models.function import FunctionModel
+    from session_pool import ConversationPool
+
+    async def stub_model(messages, info):
+        await asyncio.sleep(latency)
+        return ModelResponse(parts=[TextPart(f'Reply number {len(messages) // 2}, about your camping trip plans.')])
+
+    agent = Agent(FunctionModel(stub_model), system_prompt="You are a manica bot.")
+    pool = ConversationPool(agent, max_sessions=sessions, max_bytes=int(max_mb * 1024 * 1024), spill_dir=spill_dir)
+
+    async def user(number: int):
+        for turn in range(turns):
+            await pool.chat(f'user-{number}', f'Message {turn}: what should I pack for hiking in the mountains?')
+
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    await asyncio.gather(*(user(number) for number in range(sessions)))
+    elapsed = time.perf_counter() - started
+
+    stats = pool.stats()
+    print(f"{sessions} sessions x {turns} turns, {latency * 1000:.0f}ms stub latency")
+    print(f"  {stats['turns']} turns in {elapsed:.2f}s = {stats['turns'] / elapsed:.0f} turns/sec")
+    print(f"  RSS {rss_before:.0f}MB -> {rss_mb():.0f}MB, pool {stats['bytes'] / 1024 / 1024:.1f}MB "
+          f"in {stats['sessions']} sessions (budget {max_mb:.0f}MB)")
+    print(f"  evicted: {stats['evicted_bytes']} over bytes, {stats['evicted_lru']} over sessions, "
+          f"spilled {stats['spilled']}, rehydrated {stats['rehydrated']}")
+    # a spilled session picks up where it left off
+    summary = pool.get('user-0').get_conversation_summary()
+    assert summary['user_messages'] == turns, summary
+    print(f"  user-0 after reload: {summary}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, default=10_000)
+    parser.add_argument('--turns', type=int, default=5, help='messages per session, sent one after the other')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds the stub model takes per turn')
+    parser.add_argument('--max-mb', type=float, default=64, help='memory budget for the histories')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as spill_dir:
+        asyncio.run(run(args.sessions, args.turns, args.latency, args.max_mb, spill_dir))
+
+
+if __name__ == '__main__':
+    main()
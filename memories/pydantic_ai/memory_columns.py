@@ -0,0 +1,274 @@
+import json
+import mmap
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# one fixed width row per memory on disk, strings live in the heap file
+ROW = np.dtype([
+    ('user', '<u4'),
+    ('conversation', '<u4'),
+    ('timestamp', '<i8'),  # microseconds since 1970-01-01 (naive, like the timestamps we store)
+    ('importance', '<f4'),
+    ('content_offset', '<u8'),
+    ('content_length', '<u4'),
+    ('topics_offset', '<u8'),
+    ('topics_length', '<u4'),
+    ('id_offset', '<u8'),
+    ('id_length', '<u4'),
+])
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _to_micros(timestamp: datetime) -> int:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return (timestamp - _EPOCH) // _MICROSECOND
+
+
+class _Interner:
+    """string <-> small int table, persisted as one json string per line"""
+
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path
+        self.fsync = fsync
+        self.ids: Dict[str, int] = {}
+        self.strings: List[str] = []
+        try:
+            with open(path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # torn write, whatever referenced it was never written either
+                    self._add(json.loads(line))
+        except FileNotFoundError:
+            pass
+        self._file = None
+
+    def _add(self, value: str) -> int:
+        self.ids[value] = len(self.strings)
+        self.strings.append(value)
+        return self.ids[value]
+
+    def intern(self, value: str) -> int:
+        if value in self.ids:
+            return self.ids[value]
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+        self._file.write(json.dumps(value).encode() + b'\n')
+        self._file.flush()
+        if self.fsync:
+            # durable before any row that uses the id, a row must never outlive its string
+            os.fsync(self._file.fileno())
+        return self._add(value)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ColumnarMemoryStore:
+    """Compact memory store for millions of memories.
+
+    user_id and conversation_id are interned to ints, timestamps / importance / string
+    offsets are kept in typed numpy columns and all the text (content, topics, memory ids)
+    stays in a memory-mapped string heap on disk, so RAM use is a few dozen bytes per
+    memory no matter how long the content is. MemoryEntry objects are only built when an
+    item is accessed, which for recall means just the top-k results.
+
+    It is both the storage and the memory store: appending a memory persists it.
+    Single process only, the columns live in this process (use SQLiteMemoryStore to share).
+    """
+
+    def __init__(self, directory: str = 'vector_memory_columns', fsync: bool = False):
+        self.directory = directory
+        self.fsync = fsync
+        self.entry_factory: Callable[..., Any] = dict
+        os.makedirs(directory, exist_ok=True)
+
+        self._users = _Interner(os.path.join(directory, 'users.jsonl'), fsync)
+        self._conversations = _Interner(os.path.join(directory, 'conversations.jsonl'), fsync)
+        self._rows_path = os.path.join(directory, 'rows.bin')
+        self._heap_path = os.path.join(directory, 'heap.bin')
+        self._rows_file = None
+        self._heap_file = None
+        self._heap_size = os.path.getsize(self._heap_path) if os.path.exists(self._heap_path) else 0
+        self._heap_map: Optional[mmap.mmap] = None
+
+        self._columns: Dict[str, np.ndarray] = {}
+        self._size = 0
+        self._load_rows()
+
+    def _load_rows(self):
+        try:
+            rows_size = os.path.getsize(self._rows_path)
+        except FileNotFoundError:
+            rows_size = 0
+        if rows_size % ROW.itemsize:
+            # torn row from a crash mid-append, drop it
+            rows_size -= rows_size % ROW.itemsize
+            with open(self._rows_path, 'r+b') as f:
+                f.truncate(rows_size)
+
+        rows = np.fromfile(self._rows_path, dtype=ROW) if rows_size else np.empty(0, dtype=ROW)
+        unknown = np.flatnonzero((rows['user'] >= len(self._users.strings))
+                                 | (rows['conversation'] >= len(self._conversations.strings)))
+        if len(unknown):
+            # without fsync a power loss can keep rows whose user / conversation line never hit the disk,
+            # ids only grow so those are at the tail, drop it like a torn row
+            rows = rows[:unknown[0]]
+            with open(self._rows_path, 'r+b') as f:
+                f.truncate(len(rows) * ROW.itemsize)
+        capacity = max(1024, len(rows))
+        for name in ROW.names:
+            column = np.empty(capacity, dtype=ROW.fields[name][0])
+            column[:len(rows)] = rows[name]
+            self._columns[name] = column
+        self._size = len(rows)
+
+    def open_store(self, entry_factory: Callable[..., Any]) -> 'ColumnarMemoryStore':
+        """Use this store as VectorMemorySystem.memory_store, items are built with entry_factory"""
+        self.entry_factory = entry_factory
+        return self
+
+    # ---- typed columns ----
+
+    def column(self, name: str) -> np.ndarray:
+        return self._columns[name][:self._size]
+
+    def user_positions(self, user_id: str) -> np.ndarray:
+        if user_id not in self._users.ids:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(self.column('user') == self._users.ids[user_id])
+
+    # ---- string heap ----
+
+    def _heap_write(self, data: bytes) -> Tuple[int, int]:
+        if self._heap_file is None:
+            self._heap_file = open(self._heap_path, 'ab')
+        offset = self._heap_size
+        self._heap_file.write(data)
+        self._heap_size += len(data)
+        return offset, len(data)
+
+    def _heap_read(self, offset: int, length: int) -> str:
+        if length == 0:
+            return ''
+        if self._heap_map is None or offset + length > len(self._heap_map):
+            # the heap grew since it was mapped, map it again
+            if self._heap_file is not None:
+                self._heap_file.flush()
+            if self._heap_map is not None:
+                self._heap_map.close()
+            with open(self._heap_path, 'rb') as f:
+                self._heap_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._heap_map[offset:offset + length].decode()
+
+    # ---- sequence interface used by VectorMemorySystem ----
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Any]:
+        for position in range(self._size):
+            yield self[position]
+
+    def __getitem__(self, position: int) -> Any:
+        if position < 0:
+            position += self._size
+        if not 0 <= position < self._size:
+            raise IndexError(position)
+        c = self._columns
+        return self.entry_factory(
+            user_id=self._users.strings[c['user'][position]],
+            content=self._heap_read(c['content_offset'][position], c['content_length'][position]),
+            timestamp=_EPOCH + timedelta(microseconds=int(c['timestamp'][position])),
+            conversation_id=self._conversations.strings[c['conversation'][position]],
+            topics=self.topics(position),
+            importance_score=float(c['importance'][position]),
+            memory_id=self._heap_read(c['id_offset'][position], c['id_length'][position]),
+        )
+
+    def topics(self, position: int) -> List[str]:
+        c = self._columns
+        return json.loads(self._heap_read(c['topics_offset'][position], c['topics_length'][position]) or '[]')
+
+    def index_fields(self, positions: Optional[Iterable[int]] = None) -> Iterator[Tuple[int, str, str, List[str], float]]:
+        """(position, user_id, content, topics, importance) of every memory (or just `positions`), without building entries"""
+        c = self._columns
+        for position in (range(self._size) if positions is None else positions):
+            yield (
+                position,
+                self._users.strings[c['user'][position]],
+                self._heap_read(c['content_offset'][position], c['content_length'][position]),
+                self.topics(position),
+                float(c['importance'][position]),
+            )
+
+    def append(self, memory: Any) -> int:
+        """Persist a new memory (anything with the MemoryEntry fields), returns its position"""
+        if self._size == len(self._columns['user']):
+            for name, column in self._columns.items():
+                self._columns[name] = np.concatenate([column, np.empty_like(column)])
+
+        # strings first, so a row on disk never points at text that isn't there
+        content = self._heap_write(memory.content.encode())
+        topics = self._heap_write(json.dumps(list(memory.topics)).encode())
+        memory_id = self._heap_write(memory.memory_id.encode())
+        self._heap_file.flush()
+
+        row = np.zeros(1, dtype=ROW)[0]
+        row['user'] = self._users.intern(memory.user_id)
+        row['conversation'] = self._conversations.intern(memory.conversation_id)
+        row['timestamp'] = _to_micros(memory.timestamp)
+        row['importance'] = memory.importance_score
+        row['content_offset'], row['content_length'] = content
+        row['topics_offset'], row['topics_length'] = topics
+        row['id_offset'], row['id_length'] = memory_id
+
+        if self._rows_file is None:
+            self._rows_file = open(self._rows_path, 'ab')
+        self._rows_file.write(row.tobytes())
+        self._rows_file.flush()
+        if self.fsync:
+            os.fsync(self._heap_file.fileno())
+            os.fsync(self._rows_file.fileno())
+
+        for name in ROW.names:
+            self._columns[name][self._size] = row[name]
+        self._size += 1
+        return self._size - 1
+
+    def set_topics(self, position: int, topics: List[str]):
+        """Point a memory at new topics: the new list goes to the heap, the row gets patched in place"""
+        offset, length = self._heap_write(json.dumps(list(topics)).encode())
+        self._heap_file.flush()
+
+        patch = np.zeros(1, dtype=ROW)[0]
+        patch['topics_offset'], patch['topics_length'] = offset, length
+        start = ROW.fields['topics_offset'][1]
+        end = ROW.fields['topics_length'][1] + ROW.fields['topics_length'][0].itemsize
+        if self._rows_file is not None:
+            self._rows_file.flush()
+        with open(self._rows_path, 'r+b') as f:
+            f.seek(position * ROW.itemsize + start)
+            f.write(patch.tobytes()[start:end])
+
+        self._columns['topics_offset'][position] = offset
+        self._columns['topics_length'][position] = length
+
+    def close(self):
+        for f in (self._rows_file, self._heap_file):
+            if f is not None:
+                f.close()
+        self._rows_file = self._heap_file = None
+        if self._heap_map is not None:
+            self._heap_map.close()
+            self._heap_map = None
+        self._users.close()
+        self._conversations.close()
+        self._conversations.close()
@@ -0,0 +1,192 @@
+import hashlib
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+_WORD = re.compile(r'\w+')
+
+
+@lru_cache(maxsize=200_000)
+def _hash_token(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), 'little')
+
+
+class HashingEmbedder:
+    """Local, deterministic embedding provider (the hashing trick).
+
+    Words and word bigrams are hashed into a fixed number of buckets with a hashed sign,
+    then L2 normalised. No model download and no network, the same text always gives the
+    same vector. Anything with an `embed(texts) -> float32 array (n, dim)` method and a
+    `dim` attribute can be used instead (e.g. a sentence-transformers wrapper).
+    """
+
+    def __init__(self, dim: int = 512, bigrams: bool = True):
+        self.dim = dim
+        self.bigrams = bigrams
+
+    def _features(self, text: str) -> List[str]:
+        words = _WORD.findall(text.lower())
+        if self.bigrams:
+            return words + [f'{a} {b}' for a, b in zip(words, words[1:])]
+        return words
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = _hash_token(feature)
+                vectors[row, h % self.dim] += 1.0 if h >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k best scores, best first (argpartition, no full sort)"""
+    if k >= len(scores):
+        return np.argsort(-scores, kind='stable')
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+class _IVF:
+    """Inverted file index: k-means centroids, each row lives in the list of its nearest centroid.
+    A query only scores the rows in the `nprobe` closest lists."""
+
+    def __init__(self, matrix: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        sample = matrix[rng.choice(len(matrix), size=min(len(matrix), nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+
+        # spherical k-means, vectors are normalised so dot product == cosine
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            norms = np.linalg.norm(sums, axis=1)
+            moved = norms > 0  # an empty cluster keeps its old centroid
+            centroids[moved] = sums[moved] / norms[moved, None]
+
+        self.centroids = centroids
+        self.lists: List[List[int]] = [[] for _ in range(nlist)]
+        self._arrays: Dict[int, np.ndarray] = {}
+        for row, c in enumerate(self._assign(matrix)):
+            self.lists[c].append(row)
+        self.built_at = len(matrix)
+
+    def _assign(self, vectors: np.ndarray, chunk: int = 65_536) -> np.ndarray:
+        # chunked so the (rows x nlist) score matrix never gets huge
+        return np.concatenate([np.argmax(vectors[i:i + chunk] @ self.centroids.T, axis=1)
+                               for i in range(0, len(vectors), chunk)])
+
+    def add(self, row: int, vector: np.ndarray):
+        c = int(self._assign(vector[None, :])[0])
+        self.lists[c].append(row)
+        self._arrays.pop(c, None)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        probes = _top_k(self.centroids @ query, nprobe)
+        rows = []
+        for c in probes:
+            c = int(c)
+            if c not in self._arrays:
+                self._arrays[c] = np.asarray(self.lists[c], dtype=np.int64)
+            rows.append(self._arrays[c])
+        return np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+
+
+class _UserMatrix:
+    __slots__ = ('vectors', 'positions', 'size', 'ivf')
+
+    def __init__(self, dim: int, capacity: int = 64):
+        self.vectors = np.empty((capacity, dim), dtype=np.float32)
+        self.positions = np.empty(capacity, dtype=np.int64)
+        self.size = 0
+        self.ivf: Optional[_IVF] = None
+
+    def append(self, position: int, vector: np.ndarray):
+        if self.size == len(self.positions):
+            # double the capacity so appends stay amortized O(1) and the matrix stays contiguous
+            self.vectors = np.concatenate([self.vectors, np.empty_like(self.vectors)])
+            self.positions = np.concatenate([self.positions, np.empty_like(self.positions)])
+        self.vectors[self.size] = vector
+        self.positions[self.size] = position
+        self.size += 1
+
+
+class VectorIndex:
+    """Per-user embedding matrices for cosine top-k recall.
+
+    Every user gets one contiguous float32 matrix. Small stores are searched exactly with a
+    single matrix-vector product; once a user has `ivf_threshold` memories an IVF index is
+    due (and again every time the store doubles) so a query only scores a few clusters.
+    add() never runs the k-means itself: take_due() hands out those users, new_ivf() can run
+    in a thread and finish_ivf() installs the result, meanwhile the old IVF (or exact search)
+    keeps answering. build_ivf() does all three at once.
+    """
+
+    def __init__(self, dim: int, ivf_threshold: Optional[int] = 50_000, nprobe: int = 8):
+        self.dim = dim
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self._users: Dict[str, _UserMatrix] = {}
+        self._due: Set[str] = set()
+        self._building: Set[str] = set()
+
+    def add(self, position: int, user_id: str, vector: np.ndarray):
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._users[user_id] = _UserMatrix(self.dim)
+        user.append(position, vector)
+
+        if user.ivf is not None:
+            user.ivf.add(user.size - 1, vector)
+        if (self.ivf_threshold is not None and user.size >= self.ivf_threshold and user_id not in self._building
+                and (user.ivf is None or user.size >= 2 * user.ivf.built_at)):
+            self._due.add(user_id)
+
+    def take_due(self) -> List[str]:
+        """users whose IVF should be (re)built, they count as being built until finish_ivf()"""
+        due, self._due = list(self._due), set()
+        self._building.update(due)
+        return due
+
+    def new_ivf(self, user_id: str) -> _IVF:
+        """an IVF of the user's current rows, safe in a thread while add() goes on
+        (rows below size never change, a grown matrix is a new array)"""
+        user = self._users[user_id]
+        size = user.size
+        return _IVF(user.vectors[:size], nlist=max(1, int(np.sqrt(size))))
+
+    def finish_ivf(self, user_id: str, ivf: Optional[_IVF]):
+        """install an IVF from new_ivf() with the rows added since (None: the build failed, it comes due again)"""
+        self._building.discard(user_id)
+        self._due.discard(user_id)
+        if ivf is None:
+            return
+        user = self._users[user_id]
+        for row in range(ivf.built_at, user.size):
+            ivf.add(row, user.vectors[row])
+        user.ivf = ivf
+
+    def build_ivf(self, user_id: str):
+        """(Re)build the approximate index of one user right away, e.g. right after a bulk load"""
+        self.finish_ivf(user_id, self.new_ivf(user_id))
+
+    def search(self, user_id: str, query: np.ndarray, limit: int = 5, exact: bool = False) -> List[Tuple[float, int]]:
+        """Top `limit` (cosine similarity, position) pairs for this user"""
+        user = self._users.get(user_id)
+        if user is None or user.size == 0:
+            return []
+
+        if user.ivf is not None and not exact:
+            rows = user.ivf.candidates(query, self.nprobe)
+            scores = user.vectors[rows] @ query
+            best = rows[_top_k(scores, limit)]
+            return [(float(user.vectors[row] @ query), int(user.positions[row])) for row in best]
+
+        scores = user.vectors[:user.size] @ query
+        best = _top_k(scores, limit)
+        return [(float(scores[row]), int(user.positions[row])) for row in best]
@@ -0,0 +1,101 @@
+from array import array
+from bisect import insort
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+def tokenize(text: str) -> Set[str]:
+    """Same tokenization recall always used: lowercase + whitespace split"""
+    return set(text.lower().split())
+
+
+class _UserPostings:
+    __slots__ = ('positions', 'importance', 'content', 'topics', 'ranked')
+
+    def __init__(self):
+        self.positions = array('I')  # every memory of this user, in insertion order
+        self.importance: Dict[int, float] = {}
+        self.content: Dict[str, array] = {}  # token -> positions whose content has it
+        self.topics: Dict[str, Set[int]] = {}  # token -> positions whose topics have it (topics can change)
+        # (-importance, position) kept sorted, used to fill the results when few memories match the query
+        self.ranked: List[Tuple[float, int]] = []
+
+
+class KeywordIndex:
+    """Per-user inverted index used by VectorMemorySystem.recall_memories.
+
+    Memories are referred to by their position in the memory store. Both the user
+    partition and the token -> posting list maps are updated incrementally when a memory
+    is stored, so a query only touches the postings of its own tokens instead of
+    re-tokenizing every memory the user has.
+    """
+
+    def __init__(self):
+        self._users: Dict[str, _UserPostings] = {}
+
+    def add(self, position: int, user_id: str, content: str, topics: Iterable[str], importance: float):
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._users[user_id] = _UserPostings()
+
+        user.positions.append(position)
+        user.importance[position] = importance
+        for token in tokenize(content):
+            postings = user.content.get(token)
+            if postings is None:
+                postings = user.content[token] = array('I')
+            postings.append(position)
+        for token in tokenize(' '.join(topics)):
+            user.topics.setdefault(token, set()).add(position)
+        insort(user.ranked, (-importance, position))
+
+    def set_topics(self, position: int, user_id: str, old_topics: Iterable[str], new_topics: Iterable[str]):
+        """Move a memory to the postings of its new topics (topics get filled in after the memory is stored)"""
+        user = self._users[user_id]
+        for token in tokenize(' '.join(old_topics)):
+            postings = user.topics.get(token)
+            if postings is not None:
+                postings.discard(position)
+                if not postings:
+                    del user.topics[token]
+        for token in tokenize(' '.join(new_topics)):
+            user.topics.setdefault(token, set()).add(position)
+
+    def user_positions(self, user_id: str) -> array:
+        user = self._users.get(user_id)
+        return user.positions if user is not None else array('I')
+
+    def search(self, user_id: str, query: str, limit: int = 5) -> List[Tuple[float, int]]:
+        """Top `limit` (score, position) pairs, scored exactly like the original full scan:
+        keyword overlap * 0.7 + topic overlap * 0.3 + importance"""
+        user = self._users.get(user_id)
+        if user is None:
+            return []
+
+        keyword_overlap: Dict[int, int] = {}
+        topic_overlap: Dict[int, int] = {}
+        for token in tokenize(query):
+            for position in user.content.get(token, ()):
+                keyword_overlap[position] = keyword_overlap.get(position, 0) + 1
+            for position in user.topics.get(token, ()):
+                topic_overlap[position] = topic_overlap.get(position, 0) + 1
+
+        candidates = keyword_overlap.keys() | topic_overlap.keys()
+        scored = []
+        for position in candidates:
+            score = (keyword_overlap.get(position, 0) * 0.7) + (topic_overlap.get(position, 0) * 0.3) + user.importance[position]
+            if score > 0:
+                scored.append((score, position))
+
+        # memories that don't match anything still score their importance, only the best
+        # `limit` of them can make it into the result
+        fillers = 0
+        for neg_importance, position in user.ranked:
+            if fillers >= limit or neg_importance >= 0:
+                break
+            if position not in candidates:
+                scored.append((-neg_importance, position))
+                fillers += 1
+
+        # ties keep insertion order, same as the stable sort the full scan used
+        scored.sort(key=lambda x: (-x[0], x[1]))
+        return scored[:limit]
@@ -0,0 +1,185 @@
+"""SQLite memory store for VectorMemorySystem (stdlib sqlite3, WAL mode, FTS5 keyword search).
+
+Migrating an existing json file or append log:
+
+    python memory_sqlite.py vector_memory.json vector_memory.db
+"""
+import json
+import sqlite3
+import sys
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from memory_storage import record_id
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS memories (
+    position INTEGER PRIMARY KEY AUTOINCREMENT,
+    memory_id TEXT NOT NULL UNIQUE,
+    user_id TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    content TEXT NOT NULL,
+    topics TEXT NOT NULL DEFAULT '[]',
+    timestamp TEXT NOT NULL,
+    importance_score REAL NOT NULL DEFAULT 0.5
+);
+CREATE INDEX IF NOT EXISTS memories_by_user ON memories (user_id, importance_score DESC, position);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5(
+    user_id, content, topics, content='memories', content_rowid='position'
+);
+CREATE TRIGGER IF NOT EXISTS memories_ai AFTER INSERT ON memories BEGIN
+    INSERT INTO memories_fts (rowid, user_id, content, topics) VALUES (new.position, new.user_id, new.content, new.topics);
+END;
+CREATE TRIGGER IF NOT EXISTS memories_ad AFTER DELETE ON memories BEGIN
+    INSERT INTO memories_fts (memories_fts, rowid, user_id, content, topics) VALUES ('delete', old.position, old.user_id, old.content, old.topics);
+END;
+CREATE TRIGGER IF NOT EXISTS memories_au AFTER UPDATE ON memories BEGIN
+    INSERT INTO memories_fts (memories_fts, rowid, user_id, content, topics) VALUES ('delete', old.position, old.user_id, old.content, old.topics);
+    INSERT INTO memories_fts (rowid, user_id, content, topics) VALUES (new.position, new.user_id, new.content, new.topics);
+END;
+"""
+
+_COLUMNS = 'position, user_id, content, timestamp, conversation_id, topics, importance_score, memory_id'
+
+
+def _fts_phrase(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+class SQLiteMemoryStore:
+    """Memories in one SQLite database that several worker processes can share.
+
+    Like ColumnarMemoryStore it is both the storage and the memory store, positions are
+    the row ids. Keyword recall runs inside the database through an FTS5 index over
+    content and topics, so nothing has to be loaded into memory to be searched.
+
+    Writes can wait up to `timeout` for another process, so VectorMemorySystem runs them
+    in a worker thread (thread_safe): the connection isn't tied to the thread that opened
+    it and sqlite3 serializes access to it.
+    """
+
+    thread_safe = True
+
+    def __init__(self, path: str = 'vector_memory.db', timeout: float = 30.0):
+        self.path = path
+        self.entry_factory: Callable[..., Any] = dict
+        # timeout = how long a writer waits for another process holding the write lock
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def open_store(self, entry_factory: Callable[..., Any]) -> 'SQLiteMemoryStore':
+        """Use this store as VectorMemorySystem.memory_store, items are built with entry_factory"""
+        self.entry_factory = entry_factory
+        return self
+
+    def _entry(self, row: Tuple) -> Any:
+        _, user_id, content, timestamp, conversation_id, topics, importance, memory_id = row
+        return self.entry_factory(user_id=user_id, content=content, timestamp=timestamp,
+                                  conversation_id=conversation_id, topics=json.loads(topics),
+                                  importance_score=importance, memory_id=memory_id)
+
+    # ---- sequence interface used by VectorMemorySystem ----
+
+    def __len__(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM memories').fetchone()[0]
+
+    def __getitem__(self, position: int) -> Any:
+        row = self.conn.execute(f'SELECT {_COLUMNS} FROM memories WHERE position = ?', (position,)).fetchone()
+        if row is None:
+            raise IndexError(position)
+        return self._entry(row)
+
+    def __iter__(self) -> Iterator[Any]:
+        for row in self.conn.execute(f'SELECT {_COLUMNS} FROM memories ORDER BY position'):
+            yield self._entry(row)
+
+    def append(self, memory: Any) -> int:
+        """Insert a new memory and return its position"""
+        cursor = self.conn.execute(
+            'INSERT INTO memories (memory_id, user_id, conversation_id, content, topics, timestamp, importance_score) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (memory.memory_id, memory.user_id, memory.conversation_id, memory.content,
+             json.dumps(list(memory.topics)), memory.timestamp.isoformat(), memory.importance_score))
+        return cursor.lastrowid
+
+    def set_topics(self, position: int, topics: List[str]):
+        self.conn.execute('UPDATE memories SET topics = ? WHERE position = ?', (json.dumps(list(topics)), position))
+
+    def user_positions(self, user_id: str) -> List[int]:
+        return [row[0] for row in self.conn.execute('SELECT position FROM memories WHERE user_id = ? ORDER BY position', (user_id,))]
+
+    def index_fields(self, positions: Optional[Iterable[int]] = None) -> Iterator[Tuple[int, str, str, List[str], float]]:
+        """(position, user_id, content, topics, importance) without building entries"""
+        query = 'SELECT position, user_id, content, topics, importance_score FROM memories'
+        if positions is None:
+            rows = self.conn.execute(query + ' ORDER BY position')
+        else:
+            rows = (self.conn.execute(query + ' WHERE position = ?', (p,)).fetchone() for p in positions)
+        for position, user_id, content, topics, importance in rows:
+            yield position, user_id, content, json.loads(topics), importance
+
+    # ---- recall ----
+
+    def search(self, user_id: str, query: str, limit: int = 5) -> List[Tuple[float, int]]:
+        """Keyword recall inside the database, (score, position) pairs best first.
+
+        Memories matching any query word are ranked by bm25 (content weighted 0.7, topics 0.3)
+        plus importance, same weights the in-memory scorer uses. When fewer than `limit`
+        match, the rest is filled with the user's most important memories.
+        """
+        words = set(query.lower().split())
+        results: List[Tuple[float, int]] = []
+        if words:
+            match = '{content topics} : (' + ' OR '.join(_fts_phrase(word) for word in words) + ')'
+            match = f'user_id : {_fts_phrase(user_id)} AND {match}'
+            # bm25() is "smaller is better", flip it so that bigger scores win like everywhere else
+            results = self.conn.execute(
+                'SELECT -bm25(memories_fts, 0.0, 0.7, 0.3) + m.importance_score AS score, m.position '
+                'FROM memories_fts JOIN memories m ON m.position = memories_fts.rowid '
+                'WHERE memories_fts MATCH ? AND m.user_id = ? '
+                'ORDER BY score DESC, m.position LIMIT ?',
+                (match, user_id, limit)).fetchall()
+
+        if len(results) < limit:
+            found = {position for _, position in results}
+            fillers = self.conn.execute(
+                'SELECT importance_score, position FROM memories WHERE user_id = ? AND importance_score > 0 '
+                'ORDER BY importance_score DESC, position LIMIT ?',
+                (user_id, limit + len(found))).fetchall()
+            results += [(score, position) for score, position in fillers if position not in found][:limit - len(results)]
+        return results
+
+    # ---- migration ----
+
+    def import_records(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Bulk insert plain records (what JsonFileStorage / AppendLogStorage .load() return).
+
+        Runs in one transaction and skips memory_ids that are already there, so running a
+        migration twice is harmless. Returns how many memories were added.
+        """
+        before = len(self)
+        with self.conn:
+            self.conn.execute('BEGIN')
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO memories (memory_id, user_id, conversation_id, content, topics, timestamp, importance_score) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                ((record_id(record), record['user_id'], record['conversation_id'],
+                  record['content'], json.dumps(record.get('topics') or []), str(record['timestamp']),
+                  record.get('importance_score', 0.5))
+                 for record in records))
+        return len(self) - before
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == '__main__':
+    from memory_storage import AppendLogStorage, JsonFileStorage
+
+    source_path, target_path = sys.argv[1], sys.argv[2]
+    source = JsonFileStorage(source_path) if source_path.endswith('.json') else AppendLogStorage(source_path)
+    store = SQLiteMemoryStore(target_path)
+    print(f'migrated {store.import_records(source.load())} memories from {source_path} to {target_path}')
+    store.close()
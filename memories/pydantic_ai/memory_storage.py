@@ -0,0 +1,217 @@
+"""Storages for VectorMemorySystem.
+
+There are two kinds:
+- record storages (the classes here) load() everything as plain dicts and get written through
+  save(records) (full rewrite) or append(record) when `append_only` is set.
+- store backends (ColumnarMemoryStore, SQLiteMemoryStore) have open_store() and become the
+  memory store itself, appending a memory persists it and entries are built on access.
+  A store that also has search() does keyword recall on its own.
+
+Record storages can be shared by several processes: every read and write happens under a
+lock file next to the data, and full rewrites go to a temp file that is renamed over the
+original, so a reader never sees a half written file.
+"""
+import json
+import os
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+from filelock import FileLock
+
+
+def record_id(record: Dict[str, Any]) -> str:
+    """memory_id of a record, old json records don't have one so a stable id is derived from the content"""
+    if record.get('memory_id'):
+        return record['memory_id']
+    key = '\x1f'.join([record['user_id'], str(record['timestamp']), record['content']])
+    return uuid.uuid5(uuid.NAMESPACE_OID, key).hex
+
+
+def atomic_write(path: str, chunks: Iterable[bytes]):
+    """Write to a temp file, fsync it and rename it over `path` (a crash leaves the old file or the new one)"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class JsonFileStorage:
+    """The original storage: the whole store is one json array that gets rewritten on every save"""
+
+    append_only = False
+
+    def __init__(self, path: str = 'vector_memory.json', lock_timeout: float = 30.0):
+        self.path = path
+        self._lock = FileLock(path + '.lock', timeout=lock_timeout)
+
+    def _read(self) -> List[Dict[str, Any]]:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def load(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            records = self._read()
+        # old records have no memory_id, give them the one save() merges them by
+        # (otherwise MemoryEntry makes up a random one and every save duplicates them)
+        for record in records:
+            if not record.get('memory_id'):
+                record['memory_id'] = record_id(record)
+        return records
+
+    def save(self, records: Iterable[Dict[str, Any]]):
+        """Write our records, merged with whatever other processes saved since we loaded"""
+        with self._lock:
+            merged = {record_id(record): record for record in self._read()}
+            for record in records:
+                merged[record_id(record)] = record
+            atomic_write(self.path, [json.dumps(list(merged.values()), indent=2, default=str).encode()])
+
+    def close(self):
+        pass
+
+
+class AppendLogStorage:
+    """Append-only log storage, one json record per line.
+
+    Every write is a single append so the cost of storing a memory doesn't depend on how
+    many memories are already stored. A record with a memory_id that was already written
+    replaces the older one (that's how updates work), the old line just becomes garbage
+    that compaction throws away later.
+
+    With `import_json` the records of that JsonFileStorage file become the start of the
+    log when the log doesn't exist yet, so switching storages keeps the old memories.
+    """
+
+    append_only = True
+
+    def __init__(self, path: str = 'vector_memory.log', fsync: bool = False,
+                 compact_min_records: int = 1000, lock_timeout: float = 30.0,
+                 import_json: Optional[str] = None):
+        self.path = path
+        self.import_json = import_json
+        self.fsync = fsync
+        # only compact once there is at least this much garbage AND garbage outweighs live
+        # records, so compaction runs at most once per doubling -> amortized O(1) per append
+        self.compact_min_records = compact_min_records
+        self._lock = FileLock(path + '.lock', timeout=lock_timeout)
+
+        self._live = set()  # memory_ids we know about
+        self._dead = 0
+        self._file = None
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Rebuild the index by scanning the log.
+
+        A crash in the middle of an append can leave a torn last line behind, that tail
+        gets truncated so the next append starts on a clean line. (Appends only happen under
+        the lock, so a torn line seen under the lock really is from a crash.)
+        """
+        with self._lock:
+            # a crash during compaction only ever leaves the temp file behind, the log itself is intact
+            if os.path.exists(self.path + '.tmp'):
+                os.remove(self.path + '.tmp')
+            if self.import_json is not None and not os.path.exists(self.path) and os.path.exists(self.import_json):
+                # written in one go, a crash leaves no log and the import simply runs again
+                atomic_write(self.path, (json.dumps(record, separators=(',', ':'), default=str).encode() + b'\n'
+                                         for record in JsonFileStorage(self.import_json).load()))
+
+            records, good_offset, dead = self._scan()
+            if os.path.exists(self.path) and good_offset < os.path.getsize(self.path):
+                with open(self.path, 'r+b') as f:
+                    f.truncate(good_offset)
+
+        self._live = set(records)
+        self._dead = dead
+        return [record for record, _ in records.values()]
+
+    def _scan(self):
+        """memory_id -> (latest record, its line), offset after the last good line, number of garbage lines"""
+        records: Dict[str, Any] = {}
+        good_offset = 0
+        dead = 0
+        try:
+            with open(self.path, 'rb') as f:
+                offset = 0
+                for line in f:
+                    offset += len(line)
+                    if not line.endswith(b'\n'):
+                        break  # torn write at the tail
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # corrupt line in the middle of the log, skip it and keep going
+                        dead += 1
+                        good_offset = offset
+                        continue
+                    memory_id = record['memory_id']
+                    if memory_id in records:
+                        dead += 1  # newer version, keeps the position of the first write
+                    records[memory_id] = (record, line)
+                    good_offset = offset
+        except FileNotFoundError:
+            pass
+        return records, good_offset, dead
+
+    def _open_for_append(self):
+        # another process may have compacted the log, a handle on the replaced file would write into the void
+        if self._file is not None:
+            try:
+                replaced = os.fstat(self._file.fileno()).st_ino != os.stat(self.path).st_ino
+            except FileNotFoundError:
+                replaced = True
+            if replaced:
+                self.close()
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+
+    def append(self, record: Dict[str, Any]):
+        """Append a single record (a new memory or a newer version of an existing one)"""
+        line = json.dumps(record, separators=(',', ':'), default=str).encode() + b'\n'
+        with self._lock:
+            self._open_for_append()
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+            if record['memory_id'] in self._live:
+                self._dead += 1
+            self._live.add(record['memory_id'])
+
+            if self._dead >= self.compact_min_records and self._dead > len(self._live):
+                self._compact()
+
+    def save(self, records: Iterable[Dict[str, Any]]):
+        """Replace the whole log with the given records"""
+        lines = [json.dumps(record, separators=(',', ':'), default=str).encode() + b'\n' for record in records]
+        with self._lock:
+            self.close()
+            atomic_write(self.path, lines)
+        self._live = {json.loads(line)['memory_id'] for line in lines}
+        self._dead = 0
+
+    def compact(self):
+        """Rewrite the log keeping only the latest record of every memory"""
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        # re-scan instead of trusting what we know, other processes may have appended too
+        if self._file is not None:
+            self._file.flush()
+        records, _, _ = self._scan()
+        self.close()
+        atomic_write(self.path, (line for _, line in records.values()))
+        self._live = set(records)
+        self._dead = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
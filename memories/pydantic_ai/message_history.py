@@ -0,0 +1,119 @@
+from collections import deque
+from typing import Callable, Iterator, List, Optional
+
+from pydantic_ai.messages import ModelMessage, ModelRequest, ModelResponse, SystemPromptPart
+
+# rough per message overhead (parts, timestamps, object headers) on top of its text,
+# a short one part message measured ~750 bytes with tracemalloc
+MESSAGE_OVERHEAD_BYTES = 700
+
+
+def message_text(message: ModelMessage, system_prompt: bool = True) -> str:
+    texts = []
+    for part in message.parts:
+        if not system_prompt and isinstance(part, SystemPromptPart):
+            continue
+        if hasattr(part, 'args_as_json_str'):  # tool calls
+            texts.append(part.tool_name + part.args_as_json_str())
+        elif hasattr(part, 'model_response_str'):  # tool returns
+            texts.append(part.model_response_str())
+        else:
+            texts.append(str(getattr(part, 'content', '')))
+    return '\n'.join(texts)
+
+
+class MessageHistory:
+    """Conversation history that only ever grows by the new messages of a turn.
+
+    The first `pin` messages (the request that carries the system prompt) are kept apart
+    and never evicted, everything after goes into a deque. extend() appends a turn's new
+    messages and, with `max_messages`, evicts the oldest unpinned ones from the front,
+    so a turn costs O(new messages) no matter how long the conversation is. With
+    `count_tokens` every message is counted once on the way in and `tokens` is the
+    running total, for trimming by token budget (see OptimizedConversationManager).
+
+    Every message gets an offset, its position in the whole conversation (evicted
+    messages included), message_at() finds it while it's still held. `requests` and
+    `responses` count the held messages of each kind as they come and go, `bytes` is
+    their approximate size (text length + a fixed overhead per message).
+    """
+
+    def __init__(self, max_messages: Optional[int] = None, pin: int = 1,
+                 count_tokens: Optional[Callable[[ModelMessage], int]] = None):
+        self.max_messages = max_messages
+        self.pin = pin
+        self.count_tokens = count_tokens
+        self.pinned: List[ModelMessage] = []
+        self.pinned_tokens = 0
+        self.recent = deque()
+        self.recent_tokens = deque()  # parallel to recent, only filled with count_tokens
+        self.recent_bytes = deque()  # parallel to recent
+        self.tokens = 0
+        self.bytes = 0
+        self.requests = 0
+        self.responses = 0
+        self.added = 0  # offset of the next message
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self.pinned) + len(self.recent)
+
+    def __iter__(self) -> Iterator[ModelMessage]:
+        yield from self.pinned
+        yield from self.recent
+
+    def messages(self) -> List[ModelMessage]:
+        """as the list agent.run() wants (the agent copies it anyway, this is the only copy)"""
+        return [*self.pinned, *self.recent]
+
+    def extend(self, messages: List[ModelMessage]):
+        for message in messages:
+            self._count(message, 1)
+            self.added += 1
+            tokens = self.count_tokens(message) if self.count_tokens is not None else 0
+            self.tokens += tokens
+            size = len(message_text(message)) + MESSAGE_OVERHEAD_BYTES
+            self.bytes += size
+            if len(self.pinned) < self.pin:
+                self.pinned.append(message)
+                self.pinned_tokens += tokens
+            else:
+                self.recent.append(message)
+                self.recent_bytes.append(size)
+                if self.count_tokens is not None:
+                    self.recent_tokens.append(tokens)
+        if self.max_messages is not None:
+            while self.recent and len(self) > self.max_messages:
+                self.popleft()
+
+    def popleft(self) -> ModelMessage:
+        """evict the oldest unpinned message"""
+        if self.count_tokens is not None:
+            self.tokens -= self.recent_tokens.popleft()
+        self.bytes -= self.recent_bytes.popleft()
+        message = self.recent.popleft()
+        self._count(message, -1)
+        self.evicted += 1
+        return message
+
+    def _count(self, message: ModelMessage, change: int):
+        if isinstance(message, ModelRequest):
+            self.requests += change
+        elif isinstance(message, ModelResponse):
+            self.responses += change
+
+    def message_at(self, offset: int) -> Optional[ModelMessage]:
+        """the message at a conversation offset, None when it was evicted"""
+        if 0 <= offset < len(self.pinned):
+            return self.pinned[offset]
+        position = offset - len(self.pinned) - self.evicted
+        return self.recent[position] if 0 <= position < len(self.recent) else None
+
+    def clear(self):
+        self.pinned.clear()
+        self.recent.clear()
+        self.recent_tokens.clear()
+        self.recent_bytes.clear()
+        self.pinned_tokens = self.tokens = self.bytes = 0
+        self.requests = self.responses = 0
+        self.added = self.evicted = 0
@@ -1,25 +1,77 @@
 from base_memory import ConversationManager
+from message_history import MessageHistory, message_text
+from functools import lru_cache
+from typing import Callable, Optional
+from pydantic_ai.messages import ModelMessage, ModelRequest, RetryPromptPart, ToolReturnPart
+
+MESSAGE_OVERHEAD_TOKENS = 4  # role + separators per message, roughly what OpenAI adds
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(encoding: str = 'cl100k_base') -> Callable[[str], int]:
+    """token counter for an encoding, loaded once (falls back to ~4 chars per token without tiktoken)"""
+    try:
+        import tiktoken
+        encode = tiktoken.get_encoding(encoding).encode
+        return lambda text: len(encode(text, disallowed_special=()))
+    except Exception:  # not installed, or the encoding can't be downloaded
+        return lambda text: (len(text) + 3) // 4
+
 
 class OptimizedConversationManager(ConversationManager):
-    def __init__(self , max_messages = 20):
-        super().__init__()
+    def __init__(self , max_messages = 20, max_tokens: Optional[int] = None, encoding: str = 'cl100k_base', agent=None):
+        super().__init__(agent)
         self.max_messsages = max_messages
-    
+        # token budget mode: the history sent with every request (pinned first message +
+        # recent messages + the new input) stays under max_tokens, trimmed *before* sending
+        self.max_tokens = max_tokens
+        self.count_tokens = get_tokenizer(encoding)
+        if max_tokens is None:
+            # keeps the first message + the last max_messages-1, evicted as the new ones come in
+            self.conversation_history = MessageHistory(max_messages=max_messages)
+        else:
+            self.conversation_history = MessageHistory(count_tokens=self.message_tokens)
+
+    def message_tokens(self, message: ModelMessage) -> int:
+        return self.count_tokens(message_text(message)) + MESSAGE_OVERHEAD_TOKENS
+
     def trim_history(self):
         """keep conversation from getting too long"""
-        
-        if len(self.conversation_history)> self.max_messsages:
-            #keep the first messsage (usally contains context)
-            # adn the last max_messages-1 messages
-            first_message = self.conversation_history[0]
-            recent_messages = self.conversation_history[-(self.max_messsages-1):]
-            self.conversation_history = [first_message] + recent_messages
-    
+        if self.max_tokens is not None:
+            self.trim_to_budget()
+            return
+        #keep the first messsage (usally contains context)
+        # adn the last max_messages-1 messages
+        history = self.conversation_history
+        while history.recent and len(history) > self.max_messsages:
+            history.popleft()
+
+    def history_tokens(self) -> int:
+        return self.conversation_history.tokens
+
+    def trim_to_budget(self, reserve: int = 0):
+        """drop the oldest messages until history + `reserve` tokens fit, O(1) per dropped message"""
+        history = self.conversation_history
+        while history.recent and history.tokens + reserve > self.max_tokens:
+            history.popleft()
+            # a tool return or a response can't start the history without what came before it,
+            # so the rest of that exchange goes too (the window then starts at a user prompt)
+            while history.recent and not self._starts_turn(history.recent[0]):
+                history.popleft()
+
+    @staticmethod
+    def _starts_turn(message: ModelMessage) -> bool:
+        return isinstance(message, ModelRequest) and not any(
+            isinstance(part, (ToolReturnPart, RetryPromptPart)) for part in message.parts)
+
     async def chat(self, user_input:str) -> str:
-        result =  await super().chat(user_input)
-        self.trim_history() #optimize after each exchange
-        return result
-    
-    
+        if self.max_tokens is not None:
+            # make room for the new input first, so no request ever goes out over budget
+            self.trim_to_budget(reserve=self.count_tokens(user_input) + MESSAGE_OVERHEAD_TOKENS)
+        return await super().chat(user_input)  # max_messages evicts as the turn is added
+
+
 # Optimization wrapper for the convrestationManager it cuts of the in between part that is not nessesory and keep only first message that in most cases contains the original context and the recent 20 messages.
-# i don't like this one sliding window is better. but the way chat manager keeps an track of the topics can be used for indexing the chat.
\ No newline at end of file
+# i don't like this one sliding window is better. but the way chat manager keeps an track of the topics can be used for indexing the chat.
+# with max_tokens it is a sliding window over tokens instead: every message is counted once when it comes in,
+# the oldest ones are popped off the front before a request would go over the budget.
@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelMessagesTypeAdapter
+
+from base_memory import ConversationManager
+from message_history import message_text
+
+
+class Session:
+    __slots__ = ('manager', 'lock', 'last_access', 'busy')
+
+    def __init__(self, manager: ConversationManager):
+        self.manager = manager
+        self.lock = asyncio.Lock()
+        self.last_access = time.monotonic()
+        self.busy = 0  # turns running or waiting for the lock
+
+
+class ConversationPool:
+    """One ConversationManager per session id, all sharing one Agent.
+
+    Turns of the same session run one after the other (a lock per session, so two
+    messages from one user can't both build on the same history), different sessions
+    run concurrently. Sessions are kept in LRU order: idle for longer than `ttl_seconds`,
+    or least recently used while there are more than `max_sessions` or their histories
+    take more than `max_bytes` (MessageHistory.bytes, approximate, it doesn't count the
+    topic trackers), they are evicted.
+    With `spill_dir` an evicted session is written to disk and comes back on its next
+    message, otherwise it's dropped. A session in the middle of a turn is never evicted.
+    New managers come from `manager_factory(agent=agent)`, e.g.
+    functools.partial(OptimizedConversationManager, max_tokens=4000).
+    """
+
+    def __init__(self, agent: Optional[Agent] = None, max_sessions: int = 10_000,
+                 max_bytes: int = 256 * 1024 * 1024, ttl_seconds: Optional[float] = 3600.0,
+                 spill_dir: Optional[str] = None,
+                 manager_factory: Callable[..., ConversationManager] = ConversationManager):
+        self.agent = agent or Agent('openai:gpt-4', system_prompt="You are a manica bot.")
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.spill_dir = spill_dir
+        self.manager_factory = manager_factory
+        self.max_busy_skips = 64
+
+        self._sessions: 'OrderedDict[str, Session]' = OrderedDict()
+        self.total_bytes = 0
+        self.metrics = {'turns': 0, 'hits': 0, 'misses': 0, 'rehydrated': 0, 'spilled': 0,
+                        'evicted_ttl': 0, 'evicted_lru': 0, 'evicted_bytes': 0}
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    async def chat(self, session_id: str, user_input: str) -> str:
+        session = self._get(session_id)
+        session.busy += 1
+        try:
+            async with session.lock:
+                history = session.manager.conversation_history
+                before = history.bytes
+                try:
+                    return await session.manager.chat(user_input)
+                finally:
+                    self.total_bytes += history.bytes - before
+                    session.last_access = time.monotonic()
+                    self.metrics['turns'] += 1
+        finally:
+            session.busy -= 1
+            self._evict()
+
+    def get(self, session_id: str) -> ConversationManager:
+        """the session's manager (e.g. for get_conversation_summary), loaded if needed"""
+        return self._get(session_id).manager
+
+    def _get(self, session_id: str) -> Session:
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self.metrics['hits'] += 1
+            self._sessions.move_to_end(session_id)
+        else:
+            self.metrics['misses'] += 1
+            session = Session(self._rehydrate(session_id) or self.manager_factory(agent=self.agent))
+            self._sessions[session_id] = session
+            self.total_bytes += session.manager.conversation_history.bytes
+        session.last_access = time.monotonic()
+        return session
+
+    def stats(self) -> Dict[str, float]:
+        return {**self.metrics, 'sessions': len(self._sessions), 'bytes': self.total_bytes}
+
+    def evict_expired(self):
+        """evict idle sessions now (chat() does this too, call it from a timer when traffic is low)"""
+        self._evict()
+
+    # ---- internals ----
+
+    def _evict(self):
+        now = time.monotonic()
+        victims, skipped = [], 0
+        sessions, total_bytes = len(self._sessions), self.total_bytes
+        # LRU order is access order: idle sessions are all at the front, and so are the ones
+        # to drop when over budget, the walk stops at the first session that may stay
+        for session_id, session in self._sessions.items():
+            expired = self.ttl_seconds is not None and now - session.last_access > self.ttl_seconds
+            over_sessions = sessions > self.max_sessions
+            if not (expired or over_sessions or total_bytes > self.max_bytes):
+                break
+            if session.busy:
+                # the budget is met again after its turn, don't walk past every busy session each time
+                skipped += 1
+                if skipped > self.max_busy_skips:
+                    break
+                continue
+            victims.append((session_id, 'evicted_ttl' if expired else 'evicted_lru' if over_sessions else 'evicted_bytes'))
+            sessions -= 1
+            total_bytes -= session.manager.conversation_history.bytes
+        for session_id, reason in victims:
+            self._remove(session_id, reason)
+
+    def _remove(self, session_id: str, reason: str):
+        history = self._sessions.pop(session_id).manager.conversation_history
+        self.total_bytes -= history.bytes
+        self.metrics[reason] += 1
+        if self.spill_dir is not None and len(history):
+            self._spill(session_id, history)
+
+    def _spill_path(self, session_id: str) -> str:
+        return os.path.join(self.spill_dir, hashlib.sha1(session_id.encode()).hexdigest() + '.json')
+
+    def _spill(self, session_id: str, history):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = self._spill_path(session_id)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'session_id': session_id, 'evicted': history.evicted,
+                       'messages': ModelMessagesTypeAdapter.dump_python(history.messages(), mode='json')}, f)
+        os.replace(path + '.tmp', path)
+        self.metrics['spilled'] += 1
+
+    def _rehydrate(self, session_id: str) -> Optional[ConversationManager]:
+        if self.spill_dir is None:
+            return None
+        path = self._spill_path(session_id)
+        try:
+            with open(path) as f:
+                spilled = json.load(f)
+        except FileNotFoundError:
+            return None
+        os.remove(path)  # the session lives in memory again, it gets spilled anew when evicted
+
+        manager = self.manager_factory(agent=self.agent)
+        history = manager.conversation_history
+        messages = ModelMessagesTypeAdapter.validate_python(spilled['messages'])
+        history.extend(messages)
+        # keep the offsets the messages had before the spill, then rebuild the topics from them
+        history.evicted = spilled['evicted']
+        history.added += history.evicted
+        for position, message in enumerate(messages):
+            offset = position if position < len(history.pinned) else position + history.evicted
+            manager.topics.add(message_text(message, system_prompt=False), offset)
+        self.metrics['rehydrated'] += 1
+        return manager
@@ -0,0 +1,100 @@
+"""Concurrent write stress test for VectorMemorySystem persistence.
+
+Starts several processes, each running a number of async writers that all store memories
+into the same storage at once, then reloads the storage and checks that every single
+memory made it (zero lost writes) and that p99 store_memory latency stays under a bound.
+The model is replaced by pydantic-ai's TestModel, so no API calls are made.
+
+    python stress_writes.py --storage log --processes 4 --writers 8 --memories 50
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def open_storage(kind: str):
+    from memory_sqlite import SQLiteMemoryStore
+    from memory_storage import AppendLogStorage, JsonFileStorage
+
+    if kind == 'json':
+        return JsonFileStorage('stress.json')
+    if kind == 'log':
+        return AppendLogStorage('stress.log')
+    return SQLiteMemoryStore('stress.db')
+
+
+async def write(process: int, writers: int, memories: int, kind: str):
+    from pydantic_ai.models.test import TestModel
+    from vector_ltm import VectorMemorySystem
+
+    system = VectorMemorySystem(storage=open_storage(kind))
+    latencies = []
+
+    async def writer(number: int):
+        for i in range(memories):
+            started = time.perf_counter()
+            await system.store_memory(f'user_{number}', f'process {process} writer {number} memory {i}', f'conv_{process}')
+            latencies.append(time.perf_counter() - started)
+
+    with system.agent.override(model=TestModel()):
+        await asyncio.gather(*(writer(number) for number in range(writers)))
+        await system.aclose()
+    return latencies
+
+
+def run_process(args):
+    process, directory, writers, memories, kind = args
+    os.chdir(directory)
+    return asyncio.run(write(process, writers, memories, kind))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--storage', choices=['json', 'log', 'sqlite'], default='log')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=8, help='concurrent async writers per process')
+    parser.add_argument('--memories', type=int, default=50, help='memories stored by each writer')
+    parser.add_argument('--max-p99-ms', type=float, default=None,
+                        help='latency bound, defaults to 500ms (5s for json, which rewrites the whole file on every save)')
+    args = parser.parse_args()
+    if args.max_p99_ms is None:
+        args.max_p99_ms = 5000.0 if args.storage == 'json' else 500.0
+
+    os.environ.setdefault('OPENAI_API_KEY', 'stress-test')
+    here = os.path.dirname(os.path.abspath(__file__))
+    os.environ['PYTHONPATH'] = here + os.pathsep + os.environ.get('PYTHONPATH', '')
+    sys.path.insert(0, here)
+
+    with tempfile.TemporaryDirectory() as directory:
+        jobs = [(process, directory, args.writers, args.memories, args.storage) for process in range(args.processes)]
+        started = time.perf_counter()
+        with multiprocessing.get_context('spawn').Pool(args.processes) as pool:
+            latencies = [latency for result in pool.map(run_process, jobs) for latency in result]
+        elapsed = time.perf_counter() - started
+
+        os.chdir(directory)
+        storage = open_storage(args.storage)
+        stored = list(storage) if hasattr(storage, 'open_store') else storage.load()
+        contents = {record['content'] for record in stored}
+        storage.close()
+        os.chdir(here)
+
+    expected = args.processes * args.writers * args.memories
+    p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+    print(f'{args.storage}: {expected} writes in {elapsed:.2f}s ({expected / elapsed:.0f}/s), '
+          f'{len(contents)} stored, {len(stored)} records, p50={p50:.2f}ms p99={p99:.2f}ms')
+
+    assert len(contents) == expected, f'lost {expected - len(contents)} memories'
+    assert len(stored) == expected, f'{len(stored) - expected} duplicate records'
+    assert p99 <= args.max_p99_ms, f'p99 write latency {p99:.2f}ms over {args.max_p99_ms}ms'
+    print('ok')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+import inspect
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TopicExtractor:
+    """Background topic extraction for stored memories.
+
+    Memories are queued instead of being sent to the model one by one. A worker waits a
+    short moment so more memories can join, then sends the whole batch in one request and
+    hands the topics back through `on_topics(key, topics)`, key being whatever the caller
+    submitted the memory with (on_topics may be a coroutine function). Results are cached by content hash, identical content is only
+    ever extracted once (also when the same text is queued again while its batch is still
+    in flight).
+    """
+
+    def __init__(self,
+                 extract_batch: Callable[[List[str]], Awaitable[List[List[str]]]],
+                 on_topics: Callable[[Hashable, List[str]], Optional[Awaitable[None]]],
+                 batch_size: int = 16,
+                 max_wait: float = 0.05,
+                 concurrency: int = 1,
+                 cache_size: int = 10_000):
+        self.extract_batch = extract_batch
+        self.on_topics = on_topics
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.concurrency = concurrency
+        self.cache_size = cache_size
+
+        self._cache: 'OrderedDict[str, List[str]]' = OrderedDict()
+        self._waiting: Dict[str, List[Hashable]] = {}  # content hash -> memory keys waiting for it
+        self._contents: Dict[str, str] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    @staticmethod
+    def content_hash(content: str) -> str:
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def cached(self, content: str) -> Optional[List[str]]:
+        """Topics of content that was extracted before, None when it wasn't"""
+        content_key = self.content_hash(content)
+        if content_key in self._cache:
+            self._cache.move_to_end(content_key)
+            return self._cache[content_key]
+        return None
+
+    def submit(self, key: Hashable, content: str) -> Optional[List[str]]:
+        """Queue a memory for extraction, never waits on the model.
+
+        Returns the topics right away when this content was extracted before, otherwise None
+        and `on_topics` gets called once the batch comes back.
+        """
+        content_key = self.content_hash(content)
+        if content_key in self._cache:
+            self._cache.move_to_end(content_key)
+            return self._cache[content_key]
+
+        if content_key in self._waiting:
+            self._waiting[content_key].append(key)
+            return None
+
+        self._start()
+        self._waiting[content_key] = [key]
+        self._contents[content_key] = content
+        self._queue.put_nowait(content_key)
+        return None
+
+    def _start(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._process(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _process(self, batch: List[str]):
+        try:
+            results = await self.extract_batch([self._contents[key] for key in batch])
+        except Exception:
+            logger.exception('topic extraction failed for %d memories', len(batch))
+            results = None
+
+        for position, key in enumerate(batch):
+            memory_keys = self._waiting.pop(key)
+            del self._contents[key]
+            if results is None:
+                continue  # memories keep their empty topics, nothing gets cached
+            topics = results[position] if position < len(results) else []
+
+            self._cache[key] = topics
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+            for memory_key in memory_keys:
+                try:
+                    applied = self.on_topics(memory_key, topics)
+                    if inspect.isawaitable(applied):
+                        await applied
+                except Exception:
+                    logger.exception('failed to apply topics to memory %s', memory_key)
+
+    async def flush(self):
+        """Wait until everything queued so far has been extracted"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def aclose(self):
+        await self.flush()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
@@ -1,9 +1,17 @@
 from pydantic_ai import Agent
-from pydantic import BaseModel
-from typing import List , Optional
+from pydantic import BaseModel, Field
+from typing import Iterable, List , Optional, Tuple
 import asyncio
 from datetime import datetime
-import json
+import time
+import uuid
+from memory_storage import JsonFileStorage, AppendLogStorage
+from lazy_memory import LazyMemoryList
+from memory_index import KeywordIndex
+from memory_embeddings import HashingEmbedder, VectorIndex
+from topic_extractor import TopicExtractor
+from background_tasks import BackgroundPipeline
+import re
 
 class MemoryEntry(BaseModel):
     user_id:str
@@ -12,36 +20,132 @@ class MemoryEntry(BaseModel):
     conversation_id:str
     topics: List[str] = []
     importance_score: float = 0.5
+    memory_id: str = Field(default_factory=lambda: uuid.uuid4().hex)
     
 class VectorMemorySystem:
-        def __init__(self):
+        def __init__(self, storage=None, recall_mode: str = 'keyword', embedder=None, lazy: bool = False):
+            self._created_at = time.perf_counter()
+            # cold start numbers, time_to_first_recall is measured from construction
+            self.metrics = {'load_seconds': None, 'time_to_first_recall': None, 'first_recall_seconds': None}
             self.agent = Agent('openai:gpt-4')
+            # JsonFileStorage rewrites everything on each save, AppendLogStorage only appends the new record,
+            # ColumnarMemoryStore keeps compact columns + a memory-mapped text heap for millions of memories,
+            # SQLiteMemoryStore is a database workers can share and searches keywords itself (FTS5)
+            self.storage = storage if storage is not None else JsonFileStorage('vector_memory.json')  # (an empty store is falsy)
+            self.storage_search = hasattr(self.storage, 'search')
+            # 'keyword' = word overlap scoring, 'vector' = cosine similarity over embeddings
+            self.recall_mode = recall_mode
+            self.embedder = embedder or (HashingEmbedder() if recall_mode == 'vector' else None)
+            # lazy: don't validate entries at startup and only index a user the first time they recall something
+            # (store backends always index per user like this, lazy or not)
+            self.lazy = lazy
+            self._indexed_users: Optional[set] = None  # None = everyone is indexed
             self.memory_store: List[MemoryEntry] = []
+            self.index = KeywordIndex()
+            self.vectors: Optional[VectorIndex] = None
+            # topics are extracted in the background, batched and cached by content hash
+            self.topic_extractor = TopicExtractor(self._extract_topics_batch, self._apply_topics)
+            # storing a turn happens after the answer is returned, bounded so bursts can't pile up
+            self.background = BackgroundPipeline(concurrency=4, max_pending=256)
+            # overlapping store_memory calls (and topic updates, and indexing a user on first recall) mutate
+            # memory_store + the indexes one at a time, other processes are kept out by the storage's own file lock
+            self._lock = asyncio.Lock()
             self.load_memory()
         
         def  load_memory(self):
             """load existing memories from storage"""
-            try:
-                with open('vector_memory.json', 'r') as f:
-                    data = json.load(f)
-                    self.memory_store = [MemoryEntry(**entry) for entry in data]
-            except FileNotFoundError:
-                self.memory_store = []
-        
-        def save_memory(self):
-            """Save memories to persistent storage"""
-            with open('vector_memory.json', 'w') as f:
-                json.dump([entry.model_dump() for entry in self.memory_store], f, indent=2, default=str)
+            started = time.perf_counter()
+            if hasattr(self.storage, 'open_store'):
+                # the storage is the memory store itself, entries only get built when they're accessed
+                self.memory_store = self.storage.open_store(MemoryEntry)
+            elif self.lazy:
+                # just the parsed records, each one is validated the first time it's accessed
+                self.memory_store = LazyMemoryList(self.storage.load(), MemoryEntry)
+            else:
+                self.memory_store = [MemoryEntry(**entry) for entry in self.storage.load()]
+
+            self.index = KeywordIndex()
+            self.vectors = VectorIndex(self.embedder.dim) if self.embedder is not None else None
+            if not self._needs_index():
+                self._indexed_users = None  # recall never reads our indexes, there is nothing to build
+            elif self.lazy or hasattr(self.memory_store, 'user_positions'):
+                # store backends can hand out one user's memories, so only users who recall get indexed
+                # (a full index of millions of memories would cost far more than the store itself)
+                self._indexed_users = set()
+            else:
+                self._indexed_users = None
+                self._index_memories(self._index_fields())
+                if self.vectors is not None:
+                    for user_id in self.vectors.take_due():  # nothing to wait on yet, build them right here
+                        self.vectors.build_ivf(user_id)
+            self.metrics['load_seconds'] = time.perf_counter() - started
+        
+        def _keyword_indexed(self) -> bool:
+            """recall reads the KeywordIndex only in keyword mode, and not when the storage searches itself"""
+            return self.recall_mode == 'keyword' and not self.storage_search
+        
+        def _needs_index(self) -> bool:
+            """whether recall reads any index of ours at all"""
+            return self._keyword_indexed() or self.vectors is not None
+        
+        def _index_fields(self, positions: Optional[Iterable[int]] = None) -> Iterable[Tuple[int, str, str, List[str], float]]:
+            """(position, user_id, content, topics, importance) of every memory, read straight from the store when it can"""
+            if hasattr(self.memory_store, 'index_fields'):
+                return self.memory_store.index_fields(positions)
+            positions = range(len(self.memory_store)) if positions is None else positions
+            memories = ((p, self.memory_store[p]) for p in positions)
+            return ((p, m.user_id, m.content, m.topics, m.importance_score) for p, m in memories)
+        
+        def _index_memories(self, fields: Iterable[Tuple[int, str, str, List[str], float]]):
+            """add memories to the keyword index (keyword mode) and, if there is one, the vector index (embedded in batches)"""
+            batch = []
+            keyword_indexed = self._keyword_indexed()
+            for position, user_id, content, topics, importance in fields:
+                if keyword_indexed:
+                    self.index.add(position, user_id, content, topics, importance)
+                if self.vectors is not None:
+                    batch.append((position, user_id, content))
+                    if len(batch) == 1024:
+                        self._embed_batch(batch)
+                        batch = []
+            if batch:
+                self._embed_batch(batch)
+        
+        def _embed_batch(self, batch: List[Tuple[int, str, str]]):
+            embeddings = self.embedder.embed([content for _, _, content in batch])
+            for (position, user_id, _), vector in zip(batch, embeddings):
+                self.vectors.add(position, user_id, vector)
+        
+        def _is_indexed(self, user_id: str) -> bool:
+            return self._indexed_users is None or user_id in self._indexed_users
+        
+        def _ensure_indexed(self, user_id: str):
+            """lazy mode: index all memories of a user the first time they are needed"""
+            if self._is_indexed(user_id):
+                return
+            if not self._needs_index():
+                self._indexed_users.add(user_id)
+                return
+            positions = [int(p) for p in self.memory_store.user_positions(user_id)]
+            self._indexed_users.add(user_id)
+            self._index_memories(self._index_fields(positions))
+        
+        def save_memory(self, memory: Optional[MemoryEntry] = None):
+            """Save memories to persistent storage
+
+            append-only storages only write the given memory, otherwise the whole store is rewritten
+            """
+            if self.memory_store is self.storage:
+                return  # the store persisted the memory itself when it was appended
+            if memory is not None and self.storage.append_only:
+                self.storage.append(memory.model_dump(mode='json'))
+            elif hasattr(self.memory_store, 'records'):
+                self.storage.save(self.memory_store.records())  # doesn't validate entries nobody touched
+            else:
+                self.storage.save(entry.model_dump(mode='json') for entry in self.memory_store)
         
         async def store_memory(self , user_id : str , content:str , conversation_id: str):
-            """Store a new memory with automatic topic extraction"""
-            #extract topics using ai 
-            
-            topic_result = await self.agent.run(
-                f"Extract 3-5 key topic or themes from this text. Return as comma-seprated: {content}"
-            )
-            topics = [topic.strip() for topic in topic_result.output.split(',')]
-            
+            """Store a new memory, topics get filled in later by the background extractor"""
             #calculate importance (you could make this more sophisticated)
             importance = await self._calculate_importance(content)
             
@@ -51,12 +155,70 @@ class VectorMemorySystem:
                 content=content,
                 timestamp=datetime.now(),
                 conversation_id=conversation_id,
-                importance_score=importance , 
-                topics=topics
+                importance_score=importance
             )
+            # content that was seen before gets its cached topics right away
+            cached_topics = self.topic_extractor.cached(content)
+            memory.topics = cached_topics or []
             
-            self.memory_store.append(memory)
-            self.save_memory()
+            async with self._lock:
+                if getattr(self.memory_store, 'thread_safe', False):
+                    # a shared database can make the write wait on other processes, keep it off the event loop
+                    position = await asyncio.to_thread(self._append, memory)
+                else:
+                    position = self._append(memory)
+                if self._is_indexed(user_id):
+                    # (a user that isn't indexed yet picks this memory up when they're first recalled)
+                    self._index_memories([(position, user_id, content, memory.topics, importance)])
+                # saving waits on the file lock, keep it off the event loop
+                await asyncio.to_thread(self.save_memory, memory)
+            if cached_topics is None:
+                self.topic_extractor.submit(position, content)
+            if self.vectors is not None:
+                await self._build_due_ivfs()
+        
+        async def _build_due_ivfs(self):
+            """(re)build the IVF indexes that came due, the k-means runs in a thread so stores and recalls go on"""
+            for user_id in self.vectors.take_due():
+                ivf = None
+                try:
+                    ivf = await asyncio.to_thread(self.vectors.new_ivf, user_id)
+                finally:
+                    self.vectors.finish_ivf(user_id, ivf)
+        
+        def _append(self, memory: MemoryEntry) -> int:
+            """add a memory to the store and return its position"""
+            position = self.memory_store.append(memory)
+            # store backends return the position, a plain list returns None
+            return len(self.memory_store) - 1 if position is None else position
+        
+        async def _extract_topics_batch(self, contents: List[str]) -> List[List[str]]:
+            """extract topics for many memories with a single model request"""
+            texts = "\n\n".join(f"{number}. {content}" for number, content in enumerate(contents, 1))
+            topic_result = await self.agent.run(
+                "Extract 3-5 key topic or themes from each numbered text below. "
+                "Answer with exactly one line per text in the form `<number>: topic, topic, topic`.\n\n" + texts
+            )
+            topics: List[List[str]] = [[] for _ in contents]
+            for line in topic_result.output.splitlines():
+                match = re.match(r'\s*(\d+)\s*[:.)-]\s*(.*)', line)
+                if match and 1 <= int(match.group(1)) <= len(contents):
+                    topics[int(match.group(1)) - 1] = [t.strip() for t in match.group(2).split(',') if t.strip()]
+            return topics
+        
+        async def _apply_topics(self, position: int, topics: List[str]):
+            """called by the topic extractor once the topics of a stored memory are known"""
+            async with self._lock:
+                memory = self.memory_store[position]
+                if self._is_indexed(memory.user_id) and self._keyword_indexed():
+                    self.index.set_topics(position, memory.user_id, memory.topics, topics)
+                if getattr(self.memory_store, 'thread_safe', False):
+                    await asyncio.to_thread(self.memory_store.set_topics, position, topics)
+                elif hasattr(self.memory_store, 'set_topics'):
+                    self.memory_store.set_topics(position, topics)
+                else:
+                    memory.topics = topics
+                    await asyncio.to_thread(self.save_memory, memory)
         
         async def _calculate_importance(self , content:str) -> float:
             """Calculate how important this memori is (0.0 to 1.0)"""
@@ -75,31 +237,31 @@ class VectorMemorySystem:
         
         async def recall_memories(self , user_id: str , query:str , limit:int=5):
             """Find revelent for a user and query"""
-            user_memories = [m for m in self.memory_store if m.user_id == user_id]
+            started = time.perf_counter()
+            if not self._is_indexed(user_id):
+                # under the lock: a store_memory in flight has either appended and indexed its memory
+                # or not appended it yet, otherwise both of us would index it
+                async with self._lock:
+                    self._ensure_indexed(user_id)
+                if self.vectors is not None:
+                    # a user past the IVF threshold gets it built in the background, searched exactly until then
+                    await self.background.submit(self._build_due_ivfs)
+            if self.recall_mode == 'vector':
+                # cosine similarity between the query embedding and the user's memory embeddings
+                query_vector = self.embedder.embed([query])[0]
+                results = self.vectors.search(user_id, query_vector, limit)
+            elif self.storage_search:
+                # keyword search runs inside the storage itself (SQLite FTS5)
+                results = self.storage.search(user_id, query, limit)
+            else:
+                # simple keyword overlap, the index only touches memories sharing a word with the query
+                results = self.index.search(user_id, query, limit)
+            memories = [self.memory_store[position] for _, position in results]
             
-            if not user_memories:
-                return []
-            
-            # simple keyword (in production , you'd use vector similarity)
-            query_words = set(query.lower().split())
-            scored_memories = []
-            
-            for memory in user_memories:
-                # calculate revelence score 
-                memeory_words = set(memory.content.lower().split())
-                topic_words = set(' '.join(memory.topics).lower().split())
-                
-                keyword_overlap = len(query_words.intersection(memeory_words))
-                topic_overlap = len(query_words.intersection(topic_words))
-                
-                relevance_score = (keyword_overlap * 0.7) + (topic_overlap * 0.3) + memory.importance_score
-                
-                if relevance_score > 0:
-                    scored_memories.append((relevance_score , memory))
-                    
-            # sort by relevance and return top result
-            scored_memories.sort(key=lambda x: x[0] , reverse=True)
-            return [memory for _, memory in scored_memories[:limit]]
+            if self.metrics['time_to_first_recall'] is None:
+                self.metrics['first_recall_seconds'] = time.perf_counter() - started
+                self.metrics['time_to_first_recall'] = time.perf_counter() - self._created_at
+            return memories
         
         async def chat_with_memory(self , user_id:str , message:str , conversation_id:str)-> str:
             """Chat with full memory context"""
@@ -117,17 +279,29 @@ class VectorMemorySystem:
             full_prompt = f"{memory_context}\nCurrent message: {message}"
             response = await self.agent.run(full_prompt)
             
-            # Store this interaction
-            await self.store_memory(
-                user_id=user_id,
-                content=f"User: {message}\nAssistant: {response.output}",
-                conversation_id=conversation_id
+            # Store this interaction in the background, the answer only waits on recall + generation
+            # (submit only blocks when the background queue is full)
+            content = f"User: {message}\nAssistant: {response.output}"
+            await self.background.submit(
+                lambda: self.store_memory(user_id=user_id, content=content, conversation_id=conversation_id)
             )
             
-            return response.data
+            return response.output
+        
+        async def flush(self):
+            """Wait until every turn so far is stored and its topics are extracted"""
+            await self.background.flush()
+            await self.topic_extractor.flush()
+        
+        async def aclose(self):
+            """Flush everything and stop the background workers, call this before shutting down"""
+            await self.background.aclose()
+            await self.topic_extractor.aclose()
+            self.storage.close()
 
 # Usage example
-memory_system = VectorMemorySystem()
+# memories saved by the old json storage are imported into the log on the first run
+memory_system = VectorMemorySystem(storage=AppendLogStorage('vector_memory.log', import_json='vector_memory.json'))
 
 async def main():
     # First conversation
@@ -145,5 +319,8 @@ async def main():
     )
     # The system will remember Sarah works at TechCorp on an ML project!
 
+    # let the background saving and topic extraction finish before exiting
+    await memory_system.aclose()
+
 if __name__ == "__main__":
     asyncio.run(main())